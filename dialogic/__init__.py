@@ -1,9 +1,24 @@
 # -*- coding: utf-8 -*-
+import importlib
+
+from dialogic.utils.lazy_modules import support_module_getattr
+
 from dialogic import adapters, cascade, dialog, dialog_manager, interfaces, \
     nlg, nlu, storage, testing, utils, criteria, dialog_connector
-from dialogic.server import flask_server
 from dialogic.storage import session_storage, message_logging
 from dialogic.dialog_manager.base import COMMANDS
 from dialogic.nlu import basic_nlu
 
 from dialogic.dialog.names import COMMANDS, REQUEST_TYPES, SOURCES
+
+
+def __getattr__(name):
+    # the server imports flask and the SDKs of the messengers, so it is loaded only when it is used
+    if name == 'server':
+        return importlib.import_module('dialogic.server')
+    if name == 'flask_server':
+        return importlib.import_module('dialogic.server.flask_server')
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+support_module_getattr(__name__)
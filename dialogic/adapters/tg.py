@@ -1,11 +1,16 @@
 import copy
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, Optional
 
-import telebot
 from ..dialog.serialized_message import SerializedMessage
 from ..dialog.names import SOURCES
 from dialogic.adapters.base import BaseAdapter, Context, Response, logger
-from telebot.types import Message
+
+from dialogic.utils.lazy_modules import lazy_import
+
+if TYPE_CHECKING:
+    from telebot.types import Message
+
+telebot = lazy_import('telebot')
 
 
 class TelegramAdapter(BaseAdapter):
@@ -15,7 +20,7 @@ class TelegramAdapter(BaseAdapter):
         super(TelegramAdapter, self).__init__(**kwargs)
         self.suggest_cols = suggest_cols
 
-    def make_context(self, message: Message, **kwargs) -> Context:
+    def make_context(self, message: 'Message', **kwargs) -> Context:
         uid = self.SOURCE + '__' + str(message.from_user.id)
         ctx = Context(
             user_object=None,
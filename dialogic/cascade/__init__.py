@@ -1,3 +1,4 @@
-from . import cascade, turn
+from . import cascade, profiling, turn
 from .cascade import Cascade, Pr
+from .profiling import CascadeStats
 from .turn import DialogTurn
@@ -3,9 +3,12 @@ import re
 import attr
 import logging
 import math
+import time
 
-from typing import Callable, List, Optional, Dict
+from collections import defaultdict
+from typing import Callable, List, Optional, Dict, Tuple
 
+from .profiling import CascadeStats
 from .turn import DialogTurn
 
 
@@ -42,10 +45,87 @@ class CascadeItem:
     regexp: Optional[str] = attr.ib(default=None)
 
 
+class DispatchIndex:
+    """ The handlers of a cascade, indexed by their stages, intents and regexps,
+    so that on each turn only the handlers that can become candidates are examined.
+    The candidates are returned in the same order as by checking all the handlers one by one:
+    by priority, then by intent score (both descending), then in the order of registration.
+    """
+    def __init__(self, items: List[CascadeItem]):
+        self.items = items
+        self.n_items = len(items)
+        self.by_stage: Dict[str, List[int]] = defaultdict(list)
+        self.other_stages: List[int] = []  # the items whose stages are not a collection (e.g. a string)
+        self.by_intent: Dict[str, List[int]] = defaultdict(list)
+        self.by_regexp: Dict[str, Tuple[re.Pattern, List[int]]] = {}
+        self.unconditional: List[int] = []  # the items without intents and regexps, presorted by priority
+        for i, item in enumerate(items):
+            if item.stages:
+                if isinstance(item.stages, (list, tuple, set, frozenset)):
+                    for stage in item.stages:
+                        self.by_stage[stage].append(i)
+                else:
+                    self.other_stages.append(i)
+            if item.intents:
+                for intent in item.intents:
+                    self.by_intent[intent].append(i)
+            if item.regexp:
+                if item.regexp not in self.by_regexp:
+                    self.by_regexp[item.regexp] = (re.compile(item.regexp), [])
+                self.by_regexp[item.regexp][1].append(i)
+            if not item.intents and not item.regexp:
+                self.unconditional.append(i)
+        self.unconditional.sort(key=lambda i: (-items[i].priority, i))
+
+    def candidates(self, turn: DialogTurn) -> List[CascadeItem]:
+        items = self.items
+        allowed_stages = set(self.by_stage.get(turn.prev_stage, ()))
+        allowed_stages.update(i for i in self.other_stages if turn.prev_stage in items[i].stages)
+
+        def stage_matches(i):
+            # stages are matched strictly
+            return not items[i].stages or i in allowed_stages
+
+        # intent scores are matched strictly and then sorted
+        scores: Dict[int, float] = {}
+        for intent, score in (turn.intents or {}).items():
+            for i in self.by_intent.get(intent, ()):
+                if score > scores.get(i, -math.inf):
+                    scores[i] = score
+        if turn.text is not None:
+            for pattern, indices in self.by_regexp.values():
+                indices = [i for i in indices if scores.get(i, -math.inf) < 1 and stage_matches(i)]
+                if indices and pattern.match(turn.text):
+                    for i in indices:
+                        scores[i] = 1
+        candidates = [(i, score) for i, score in scores.items() if stage_matches(i)]
+        if not candidates:
+            return [items[i] for i in self.unconditional if stage_matches(i)]
+        candidates.extend((i, -math.inf) for i in self.unconditional if stage_matches(i))
+        candidates.sort(key=lambda pair: (-items[pair[0]].priority, -pair[1], pair[0]))
+        return [items[i] for i, score in candidates]
+
+
 class Cascade:
     def __init__(self):
         self.handlers: List[CascadeItem] = []
         self.postprocessors: Dict[str, POSTPROCESSOR_TYPE] = {}
+        self.stats: Optional[CascadeStats] = None
+        self._index: Optional[DispatchIndex] = None
+
+    def enable_stats(self, stats: CascadeStats = None) -> CascadeStats:
+        """ Start collecting the statistics of the handlers and postprocessors (into a new object, if not given) """
+        self.stats = stats or CascadeStats()
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+
+    def get_index(self) -> DispatchIndex:
+        """ Return the dispatch index of the handlers, rebuilding it if handlers have been added """
+        if self._index is None or self._index.items is not self.handlers or self._index.n_items != len(self.handlers):
+            self._index = DispatchIndex(self.handlers)
+        return self._index
 
     def add_handler(
             self,
@@ -74,33 +154,20 @@ class Cascade:
                 checker=checker,
                 regexp=regexp
             ))
+            self._index = None
             return f
         return wrap
 
     def __call__(self, turn: DialogTurn) -> Optional[str]:
         if turn.is_complete:
             return None
-        candidates = []
-        for item in self.handlers:
-            # stages are matched strictly
-            if item.stages:
-                if turn.prev_stage not in item.stages:
-                    continue
-            # intent scores are matched strictly and then sorted
-            intent_score = -math.inf
-            if item.intents:
-                intent_score = max(turn.intents.get(intent, -math.inf) for intent in item.intents)
-            if intent_score < 1 and item.regexp and turn.text is not None:
-                if re.match(item.regexp, turn.text):
-                    intent_score = 1
-            if (item.intents or item.regexp) and intent_score == -math.inf:
-                continue
-            candidates.append((item.priority, intent_score, item))
-        candidates.sort(key=lambda x: x[:2], reverse=True)
-        logger.debug('sorted candidates: {}'.format([c[2].handler.__name__ for c in candidates]))
+        candidates = self.get_index().candidates(turn)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('sorted candidates: {}'.format([item.handler.__name__ for item in candidates]))
 
-        for candidate in candidates:
-            item = candidate[2]
+        if self.stats is not None:
+            return self._select_with_stats(turn, candidates, self.stats)
+        for item in candidates:
             if item.checker and not item.checker(turn):
                 continue
             result = item.handler(turn)
@@ -108,6 +175,25 @@ class Cascade:
                 return item.handler.__name__
         return None
 
+    @staticmethod
+    def _select_with_stats(turn: DialogTurn, candidates: List[CascadeItem], stats: CascadeStats) -> Optional[str]:
+        """ The same as the loop over candidates in `__call__`, but with measuring time of the checkers and handlers """
+        stats.add_candidates([item.handler.__name__ for item in candidates])
+        for item in candidates:
+            name = item.handler.__name__
+            if item.checker:
+                start = time.perf_counter()
+                passed = item.checker(turn)
+                stats.add_checker(name, time.perf_counter() - start, passed=bool(passed))
+                if not passed:
+                    continue
+            start = time.perf_counter()
+            item.handler(turn)
+            stats.add_handler(name, time.perf_counter() - start, won=turn.is_complete)
+            if turn.is_complete:
+                return name
+        return None
+
     def add_postprocessor(self, name: str, function: POSTPROCESSOR_TYPE):
         self.postprocessors[name] = function
 
@@ -133,7 +219,10 @@ class Cascade:
             f = self.get_postprocessor(key)
             if not f:
                 return
+            start = time.perf_counter()
             if form:
                 f(turn, form=form)
             else:
                 f(turn)
+            if self.stats is not None:
+                self.stats.add_postprocessor(key, time.perf_counter() - start)
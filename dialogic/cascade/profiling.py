@@ -0,0 +1,106 @@
+"""
+This module collects the statistics of a cascade: how often its handlers are selected, and how much time they take.
+"""
+import copy
+import json
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+
+def _new_timing() -> dict:
+    return {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+
+
+def _add_timing(timing, seconds):
+    timing['calls'] += 1
+    timing['seconds'] += seconds
+    timing['max_seconds'] = max(timing['max_seconds'], seconds)
+
+
+def _new_handler_record() -> dict:
+    return {
+        'candidate': 0,  # the handler was selected as a candidate for the turn
+        'rejected': 0,  # its checker returned False
+        'declined': 0,  # it was called, but did not complete the turn
+        'won': 0,  # it completed the turn
+        'checker': _new_timing(),
+        'handler': _new_timing(),
+    }
+
+
+class CascadeStats:
+    """ Aggregated statistics of the handlers, checkers and postprocessors of a cascade, and of the phases of turns
+    in a dialog manager. The times are measured in seconds. The handlers and postprocessors are identified by names.
+    The statistics are collected only while they are enabled (see `Cascade.enable_stats`).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.handlers: Dict[str, dict] = defaultdict(_new_handler_record)
+        self.postprocessors: Dict[str, dict] = defaultdict(_new_timing)
+        self.phases: Dict[str, dict] = defaultdict(_new_timing)
+
+    def reset(self):
+        with self._lock:
+            self.handlers.clear()
+            self.postprocessors.clear()
+            self.phases.clear()
+
+    def add_candidates(self, names: List[str]):
+        with self._lock:
+            for name in names:
+                self.handlers[name]['candidate'] += 1
+
+    def add_checker(self, name: str, seconds: float, passed: bool):
+        with self._lock:
+            record = self.handlers[name]
+            _add_timing(record['checker'], seconds)
+            if not passed:
+                record['rejected'] += 1
+
+    def add_handler(self, name: str, seconds: float, won: bool):
+        with self._lock:
+            record = self.handlers[name]
+            _add_timing(record['handler'], seconds)
+            record['won' if won else 'declined'] += 1
+
+    def add_postprocessor(self, name: str, seconds: float):
+        with self._lock:
+            _add_timing(self.postprocessors[name], seconds)
+
+    def add_phase(self, name: str, seconds: float):
+        with self._lock:
+            _add_timing(self.phases[name], seconds)
+
+    @contextmanager
+    def measure_phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def slowest_handlers(self, n=10) -> List[Tuple[str, float]]:
+        """ Return the names of the handlers with the largest total time of their checkers and calls """
+        with self._lock:
+            totals = [
+                (name, record['checker']['seconds'] + record['handler']['seconds'])
+                for name, record in self.handlers.items()
+            ]
+        return sorted(totals, key=lambda pair: pair[1], reverse=True)[:n]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'handlers': copy.deepcopy(dict(self.handlers)),
+                'postprocessors': copy.deepcopy(dict(self.postprocessors)),
+                'phases': copy.deepcopy(dict(self.phases)),
+            }
+
+    def dump(self, path):
+        """ Save the statistics as a JSON file """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
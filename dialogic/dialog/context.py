@@ -6,6 +6,7 @@ from typing import Optional
 
 from .names import REQUEST_TYPES, SOURCES
 from dialogic.interfaces.yandex import YandexRequest
+from dialogic.nlu.basic_nlu import AnalyzedText, analyze
 
 
 logger = logging.getLogger(__name__)
@@ -28,6 +29,7 @@ class Context:
         self.request_type = request_type
         self.payload = payload
         self.yandex: Optional[YandexRequest] = yandex
+        self._analyzed_text: Optional[AnalyzedText] = None
 
     @property
     def user_object(self):
@@ -37,6 +39,13 @@ class Context:
     def add_user_object(self, user_object):
         self._user_object = copy.deepcopy(user_object)
 
+    @property
+    def analyzed_text(self) -> AnalyzedText:
+        """ The normalized forms of the message text, computed once and shared by all the dialog managers """
+        if self._analyzed_text is None or self._analyzed_text.text != (self.message_text or ''):
+            self._analyzed_text = analyze(self.message_text or '')
+        return self._analyzed_text
+
     def session_is_new(self):
         # todo: define new session for non-Alice sources as well
         return bool(self.metadata.get('new_session'))
@@ -9,6 +9,7 @@ Automaton dialog manager is based on several concepts:
 import attr
 import copy
 import logging
+import os
 
 from collections import Counter, defaultdict, OrderedDict
 from collections.abc import Mapping
@@ -16,7 +17,7 @@ from typing import Dict, Optional, Tuple
 
 from dialogic.dialog import Context, Response
 from dialogic.dialog.phrase import Phrase
-from dialogic.nlu.matchers import make_matcher, RegexMatcher
+from dialogic import nlu
 from dialogic.utils.configuration import load_config
 
 from dialogic.dialog_manager.base import CascadableDialogManager
@@ -83,15 +84,19 @@ class FSAConfig:
 
 
 class AutomatonDialogManager(CascadableDialogManager):
-    def __init__(self, config, matcher='exact', match_score_first=False, **kwargs):
+    def __init__(
+            self, config, matcher='exact', match_score_first=False, max_intents=None, snapshot_path=None, **kwargs
+    ):
         super(AutomatonDialogManager, self).__init__(**kwargs)
         if isinstance(matcher, str):
-            matcher = make_matcher(matcher)
+            matcher = nlu.matchers.make_matcher(matcher)
         elif isinstance(matcher, Mapping):
-            matcher = make_matcher(**matcher)
+            matcher = nlu.matchers.make_matcher(**matcher)
         self.matcher = matcher
-        self.regex_matcher = RegexMatcher()
+        self.regex_matcher = nlu.matchers.RegexMatcher()
         self.match_score_first = match_score_first
+        self.max_intents = max_intents  # if set, only this number of the best intents is matched by each matcher
+        self.snapshot_path = snapshot_path  # if set, the fitted matchers are saved to and restored from this directory
 
         if not isinstance(config, FSAConfig):
             config = FSAConfig(**load_config(config))
@@ -241,7 +246,7 @@ class AutomatonDialogManager(CascadableDialogManager):
                 labels.append(intent.name)
             if intent.threshold:
                 self.matcher.thresholds[intent_name] = intent.threshold
-        self.matcher.fit(texts, labels)
+        self._fit_matcher(self.matcher, texts, labels, snapshot_name='matcher')
 
         texts = []
         labels = []
@@ -254,7 +259,17 @@ class AutomatonDialogManager(CascadableDialogManager):
             for example in regex:
                 texts.append(example)
                 labels.append(intent.name)
-        self.regex_matcher.fit(texts, labels)
+        self._fit_matcher(self.regex_matcher, texts, labels, snapshot_name='regex_matcher')
+
+    def _fit_matcher(self, matcher, texts, labels, snapshot_name):
+        if not self.snapshot_path:
+            matcher.fit(texts, labels)
+            return
+        path = os.path.join(self.snapshot_path, snapshot_name)
+        source_hash = nlu.snapshots.source_hash(texts, labels)
+        if not matcher.load(path, source_hash=source_hash):
+            matcher.fit(texts, labels)
+            matcher.save(path, source_hash=source_hash)
 
     def extract_prev_state(self, context: Context) -> Optional[State]:
         state_name = context.user_object.get('automaton', {}).get(self.name, {}).get('state_name')
@@ -288,8 +303,12 @@ class AutomatonDialogManager(CascadableDialogManager):
         return self.initial_state, user_object
 
     def get_intent_scores(self, context: Context) -> Counter:
-        scores = self.matcher.aggregate_scores(context.message_text)
-        scores.update(self.regex_matcher.aggregate_scores(context.message_text))
+        if self.max_intents:
+            scores = Counter(dict(self.matcher.match_top_k(context.message_text, k=self.max_intents)))
+            scores.update(dict(self.regex_matcher.match_top_k(context.message_text, k=self.max_intents)))
+        else:
+            scores = self.matcher.aggregate_scores(context.message_text)
+            scores.update(self.regex_matcher.aggregate_scores(context.message_text))
         if context.yandex and context.yandex.request.nlu:
             for intent in context.yandex.request.nlu.intents:
                 scores[intent] = 1
@@ -73,12 +73,12 @@ class GreetAndHelpDialogManager(CascadableDialogManager):
     def is_first_message(self, context):
         if not context.message_text or context.message_text == '/start':
             return True
-        if basic_nlu.like_help(context.message_text):
+        if basic_nlu.like_help(context.analyzed_text):
             return True
         return False
 
     def is_like_help(self, context):
-        return basic_nlu.like_help(context.message_text)
+        return basic_nlu.like_help(context.analyzed_text)
 
     def is_like_exit(self, context):
-        return basic_nlu.like_exit(context.message_text)
+        return basic_nlu.like_exit(context.analyzed_text)
@@ -3,15 +3,17 @@ import yaml
 
 from collections.abc import Iterable
 
+from .. import nlu
 from ..nlu import basic_nlu
-from ..nlu.matchers import make_matcher
 from .base import CascadableDialogManager, Context, Response
 
 
 class FAQDialogManager(CascadableDialogManager):
     """ This dialog manager tries to match the input message with one of the questions from its config,
-    and if successful, gives the corresponding answer. """
-    def __init__(self, config, matcher='tf-idf', *args, **kwargs):
+    and if successful, gives the corresponding answer.
+    If `snapshot_path` is given, the fitted matcher is restored from this directory (or saved into it after fitting).
+    """
+    def __init__(self, config, matcher='tf-idf', *args, snapshot_path=None, **kwargs):
         super(FAQDialogManager, self).__init__(*args, **kwargs)
         if isinstance(config, str):
             with open(config, 'r', encoding='utf-8') as f:
@@ -21,7 +23,7 @@ class FAQDialogManager(CascadableDialogManager):
         else:
             raise ValueError('Config must be a filename or a list.')
         if isinstance(matcher, str):
-            matcher = make_matcher(matcher)
+            matcher = nlu.matchers.make_matcher(matcher)
         self.matcher = matcher
         self._q2i = {}
         self._i2a = {}
@@ -30,17 +32,22 @@ class FAQDialogManager(CascadableDialogManager):
         question_labels = []
         for i, pair in enumerate(self._cfg):
             questions = self._extract_string_or_strings(pair, key='q')
-            for q in questions:
-                q2 = self._normalize(q)
+            for q2 in basic_nlu.normalize_batch(questions):
                 self._q2i[q2] = i
                 question_keys.append(q2)
                 question_labels.append(i)
             self._i2a[i] = self._extract_string_or_strings(pair, key='a')
             self._i2s[i] = self._extract_string_or_strings(pair, key='s', allow_empty=True)
-        self.matcher.fit(question_keys, question_labels)
+        if snapshot_path:
+            source_hash = nlu.snapshots.source_hash(question_keys, question_labels)
+            if not self.matcher.load(snapshot_path, source_hash=source_hash):
+                self.matcher.fit(question_keys, question_labels)
+                self.matcher.save(snapshot_path, source_hash=source_hash)
+        else:
+            self.matcher.fit(question_keys, question_labels)
 
     def try_to_respond(self, ctx: Context):
-        text = self._normalize(ctx.message_text)
+        text = ctx.analyzed_text.normalized
         index, score = self.matcher.match(text)
         if index is None:
             return None
@@ -64,6 +71,3 @@ class FAQDialogManager(CascadableDialogManager):
         else:
             raise ValueError('The question "{}" is not a string or list.'.format(data))
         return result
-
-    def _normalize(self, text):
-        return basic_nlu.fast_normalize(text)
@@ -1,7 +1,8 @@
 import re
 
 from .base import CascadableDialogManager, Context, Response
-from dialogic.nlu import basic_nlu, matchers
+from dialogic import nlu
+from dialogic.nlu import basic_nlu
 from dialogic.utils.configuration import load_config
 
 from typing import List, Dict, Optional
@@ -41,7 +42,7 @@ class FieldConfig:
         self.validate_raw = obj.get('validate_raw', False)
 
         if self.options is not None:
-            self.matcher = matchers.make_matcher(**obj.get('matching', {'key': 'levenshtein', 'threshold': 0.8}))
+            self.matcher = nlu.matchers.make_matcher(**obj.get('matching', {'key': 'levenshtein', 'threshold': 0.8}))
             self.matcher.fit(self.all_options_texts, self.all_options_texts)
         else:
             self.matcher = None
@@ -108,8 +109,7 @@ class FormFillingDialogManager(CascadableDialogManager):
 
     def try_to_respond(self, ctx: Context):
         user_object = ctx.user_object or {}
-        raw = ctx.message_text
-        normalized = basic_nlu.fast_normalize(raw)
+        normalized = ctx.analyzed_text.normalized
         form = user_object.get('forms', {}).get(self.config.form_name, {})
         form['name'] = self.config.form_name
         if form.get('is_active'):
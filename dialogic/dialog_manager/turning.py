@@ -1,21 +1,31 @@
 import logging
 import time
 import yaml
-from typing import Union, Type, Tuple, Dict
+
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Union, Type, Tuple, Dict, Optional
 
 from ..nlu.regex_expander import load_intents_with_replacement
 from ..interfaces.yandex import extract_yandex_forms
 from ..nlu.regex_utils import match_forms
-from dialogic.cascade import DialogTurn
+from dialogic.cascade import CascadeStats, DialogTurn
 from dialogic.dialog import Context, Response
 from dialogic.dialog_manager import CascadableDialogManager
+from dialogic import nlu
 from dialogic.nlu import basic_nlu
-from dialogic.nlu.basic_nlu import fast_normalize
-from dialogic.nlu.matchers import TFIDFMatcher, TextNormalization, make_matcher_with_regex, AggregationMatcher
+
+if TYPE_CHECKING:
+    from dialogic.nlu.matchers import AggregationMatcher, RegexMatcher
 
 logger = logging.getLogger(__name__)
 
 
+@contextmanager
+def _no_measurement():
+    # the same as contextlib.nullcontext, which is not available in Python 3.6
+    yield
+
+
 class TurnDialogManager(CascadableDialogManager):
     TURN_CLS = DialogTurn
 
@@ -28,6 +38,9 @@ class TurnDialogManager(CascadableDialogManager):
             add_basic_nlu=True,
             turn_cls: Type[DialogTurn] = None,
             reset_stage=True,
+            max_intents=None,
+            snapshot_path=None,
+            instrument=False,
             **kwargs
     ):
         super(TurnDialogManager, self).__init__(**kwargs)
@@ -38,10 +51,16 @@ class TurnDialogManager(CascadableDialogManager):
         self.intents_file = intents_file
         self.expressions_file = expressions_file
         self.intents = {}
-        self.intent_matcher: AggregationMatcher = None
+        self.intent_matcher: 'AggregationMatcher' = None
+        self.regex_matcher: 'Optional[RegexMatcher]' = None
         self.matcher_threshold = matcher_threshold
         self.add_basic_nlu = add_basic_nlu
         self.reset_stage = reset_stage
+        self.max_intents = max_intents  # if set, only this number of the best intents is matched
+        self.snapshot_path = snapshot_path  # if set, the fitted matchers are saved to and restored from this directory
+        self.stats: Optional[CascadeStats] = None
+        if instrument:
+            self.enable_stats()
 
         if intents_file:
             self.load_intents(intents_file=intents_file)
@@ -58,44 +77,74 @@ class TurnDialogManager(CascadableDialogManager):
         else:
             return
 
-        self.intent_matcher = make_matcher_with_regex(
-            base_matcher=TFIDFMatcher(
-                text_normalization=TextNormalization.FAST_LEMMATIZE, threshold=self.matcher_threshold
+        matchers = nlu.matchers
+        self.regex_matcher = matchers.RegexMatcher()
+        self.intent_matcher = matchers.make_matcher_with_regex(
+            base_matcher=matchers.TFIDFMatcher(
+                text_normalization=matchers.TextNormalization.FAST_LEMMATIZE, threshold=self.matcher_threshold
             ),
             intents=self.intents,
+            re_matcher=self.regex_matcher,
+            snapshot_path=self.snapshot_path,
         )
 
+    def enable_stats(self, stats: CascadeStats = None) -> CascadeStats:
+        """ Start collecting the time of each phase of the turns, and the statistics of the cascade handlers """
+        self.stats = self.cascade.enable_stats(stats)
+        return self.stats
+
+    def disable_stats(self):
+        self.stats = None
+        self.cascade.disable_stats()
+
+    def _measure(self, phase):
+        if self.stats is None:
+            return _no_measurement()
+        return self.stats.measure_phase(phase)
+
     def try_to_respond(self, ctx: Context) -> Union[Response, None]:
         t = time.time()
-        self.preprocess_context(ctx=ctx)
-        text, intents, forms = self.nlu(ctx=ctx)
-        turn = self.turn_cls(
-            ctx=ctx,
-            text=text,
-            intents=intents,
-            forms=forms,
-            user_object=ctx.user_object or {},
-        )
-        self.preprocess_turn(turn=turn)
-        handler_name = self.cascade(turn)
-        logger.debug(f"Final handler: {handler_name}")
-        response = turn.make_response()
-        response.handler = handler_name
-        self.postprocess_response(response=response, turn=turn)
+        with self._measure('total'):
+            with self._measure('preprocess_context'):
+                self.preprocess_context(ctx=ctx)
+            with self._measure('nlu'):
+                text, intents, forms = self.nlu(ctx=ctx)
+            turn = self.turn_cls(
+                ctx=ctx,
+                text=text,
+                intents=intents,
+                forms=forms,
+                user_object=ctx.user_object or {},
+            )
+            with self._measure('preprocess_turn'):
+                self.preprocess_turn(turn=turn)
+            with self._measure('cascade'):
+                handler_name = self.cascade(turn)
+            logger.debug(f"Final handler: {handler_name}")
+            with self._measure('make_response'):
+                response = turn.make_response()
+            response.handler = handler_name
+            with self._measure('postprocess_response'):
+                self.postprocess_response(response=response, turn=turn)
         logger.debug(f'DM response took {time.time() - t} seconds')
         return response
 
     def normalize_text(self, ctx: Context):
-        text = fast_normalize(ctx.message_text or '')
-        return text
+        return ctx.analyzed_text.normalized
 
     def nlu(self, ctx: Context) -> Tuple[str, Dict[str, float], Dict[str, Dict]]:
         text = self.normalize_text(ctx=ctx)
-        if self.intent_matcher:
+        if self.intent_matcher and self.max_intents:
+            intents = dict(self.intent_matcher.match_top_k(text, k=self.max_intents))
+        elif self.intent_matcher:
             intents = self.intent_matcher.aggregate_scores(text)
         else:
             intents = {}
-        forms = match_forms(text=text, intents=self.intents or {})
+        if self.regex_matcher:
+            # the forms have been extracted in the same pass as the regex intent scores
+            forms = self.regex_matcher.match_forms(text)
+        else:
+            forms = match_forms(text=text, intents=self.intents or {})
         if ctx.yandex:
             ya_forms = extract_yandex_forms(ctx.yandex)
             forms.update(ya_forms)
@@ -103,11 +152,11 @@ class TurnDialogManager(CascadableDialogManager):
                 intents[intent_name] = 1
 
         if self.add_basic_nlu:
-            if basic_nlu.like_help(ctx.message_text):
+            if basic_nlu.like_help(ctx.analyzed_text):
                 intents['help'] = max(intents.get('help', 0), 0.9)
-            if basic_nlu.like_yes(ctx.message_text):
+            if basic_nlu.like_yes(ctx.analyzed_text):
                 intents['yes'] = max(intents.get('yes', 0), 0.9)
-            if basic_nlu.like_no(ctx.message_text):
+            if basic_nlu.like_no(ctx.analyzed_text):
                 intents['no'] = max(intents.get('no', 0), 0.9)
 
         return text, intents, forms
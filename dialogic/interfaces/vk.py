@@ -2,12 +2,13 @@ import json
 import logging
 import random
 import re
-import requests
 import threading
 import time
 
+from ..utils.lazy_modules import lazy_import
 
 logger = logging.getLogger(__name__)
+requests = lazy_import('requests')
 
 VK_API_URL = 'https://api.vk.com/method/'
 
@@ -154,6 +155,7 @@ class VKBot:
 
     def set_postponed_webhook(self, url, secret_key=None, interval=1, remove_old=True):
         """ Run `set_webhook`, as soon as the webhook url starts responding """
+
         def runner():
             while True:
                 logger.info('checking webhook availability...')
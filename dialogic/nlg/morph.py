@@ -1,4 +1,4 @@
-from dialogic.nlu.basic_nlu import PYMORPHY
+from dialogic.nlu.basic_nlu import get_morph
 
 
 def with_number(noun, number):
@@ -9,8 +9,9 @@ def with_number(noun, number):
 def agree_with_number(noun, number):
     last = abs(number) % 10
     tens = abs(number) % 100 // 10
-    if PYMORPHY:
-        parses = PYMORPHY.parse(noun)
+    morph = get_morph()
+    if morph:
+        parses = morph.parse(noun)
         if parses:
             return parses[0].make_agree_with_number(abs(number)).word
     # detect conjugation based on the word ending
@@ -34,10 +35,11 @@ def agree_with_number(noun, number):
 
 
 def inflect_case(text, case):
-    if PYMORPHY:
+    morph = get_morph()
+    if morph:
         res = []
         for word in text.split():
-            parses = PYMORPHY.parse(word)
+            parses = morph.parse(word)
             word_infl = None
             if parses:
                 inflected = parses[0].inflect({case})
@@ -1 +1,17 @@
-from . import basic_nlu, matchers, regex_expander
+import importlib
+
+from ..utils.lazy_modules import support_module_getattr
+
+from . import basic_nlu
+
+_LAZY_MODULES = {'matchers', 'regex_expander', 'snapshots'}
+
+
+def __getattr__(name):
+    # these modules import numpy and other heavy packages, so they are loaded only when they are used
+    if name in _LAZY_MODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+support_module_getattr(__name__)
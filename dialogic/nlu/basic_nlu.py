@@ -1,45 +1,216 @@
-import pymorphy2
 import re
+import threading
 
+from contextlib import contextmanager
 from functools import lru_cache
+from typing import Dict, List, Optional, Union
 
-PYMORPHY = pymorphy2.MorphAnalyzer()
+from .lemmas import LemmaTable, write_lemma_table
+from ..utils.lazy_modules import support_module_getattr
 
+_MORPH_LOCK = threading.Lock()
 
-@lru_cache(maxsize=16384)
-def word2lemma(word):
-    hypotheses = PYMORPHY.parse(word)
+# the precomputed lemmas, consulted before pymorphy2 (see load_lemma_table)
+LEMMA_TABLE: Optional[LemmaTable] = None
+# the words lemmatized by pymorphy2, to be added to the next lemma table (see save_lemma_table)
+MAX_OBSERVED_WORDS = 1000000
+_observed_words = set()
+
+
+def get_morph():
+    """ Return the pymorphy2 analyzer; it is created on the first call, because this takes a lot of time and memory """
+    morph = globals().get('PYMORPHY')
+    if morph is None:
+        with _MORPH_LOCK:
+            morph = globals().get('PYMORPHY')
+            if morph is None:
+                import pymorphy2
+                morph = pymorphy2.MorphAnalyzer()
+                globals()['PYMORPHY'] = morph
+    return morph
+
+
+def __getattr__(name):
+    # PYMORPHY is kept as a module attribute for compatibility, but it is created only when it is accessed
+    if name == 'PYMORPHY':
+        return get_morph()
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+support_module_getattr(__name__)
+
+
+def _parse_lemma(word):
+    hypotheses = get_morph().parse(word)
     if len(hypotheses) == 0:
         return word
     return hypotheses[0].normal_form
 
 
+@lru_cache(maxsize=16384)
+def word2lemma(word):
+    if LEMMA_TABLE is not None:
+        lemma = LEMMA_TABLE.get(word)
+        if lemma is not None:
+            return lemma
+    if len(_observed_words) < MAX_OBSERVED_WORDS:
+        _observed_words.add(word)
+    return _parse_lemma(word)
+
+
+def save_lemma_table(path, texts=()):
+    """ Save the lemmas of the words from the texts (e.g. intent examples), from the current lemma table,
+    and of the words that have been lemmatized by pymorphy2 in this process, into a file for `load_lemma_table`.
+    """
+    words = dict(LEMMA_TABLE.items()) if LEMMA_TABLE is not None else {}
+    new_words = set(_observed_words)
+    for text in texts:
+        new_words.update(analyze(text).clean.split())
+    for word in new_words:
+        if word not in words:
+            words[word] = word2lemma(word)
+    write_lemma_table(path, words)
+
+
+def load_lemma_table(path):
+    """ Lemmatize the words from the table saved by `save_lemma_table` without pymorphy2.
+    The table is memory-mapped, so all the processes that load it share the same memory.
+    """
+    global LEMMA_TABLE
+    LEMMA_TABLE = LemmaTable(path)
+    word2lemma.cache_clear()
+
+
+# The normalized text consists of the runs of these characters in the lowercased text, separated by single spaces.
+# We consider '-' as a delimiter, because it is often missing in results of ASR.
+# todo: preserve floats
+_WORD_PATTERN = re.compile('[a-zа-яё0-9]+')
+
+
+def _clean(text: str) -> str:
+    """ Lowercase the text and replace all the sequences of other characters than letters and digits by spaces """
+    return ' '.join(_WORD_PATTERN.findall(text.lower()))
+
+
+class AnalyzedText:
+    """ A text together with its normalized forms, which are computed lazily and at most once.
+    Use `analyze` to get a shared (cached) analysis of a text instead of creating these objects directly.
+    """
+    def __init__(self, text):
+        self.text = text
+        self._clean = None  # lowercased text without punctuation, before replacing "ё"
+        self._normalized = None
+        self._lemmatized = None
+
+    def __repr__(self):
+        return 'AnalyzedText({!r})'.format(self.text)
+
+    @property
+    def clean(self) -> str:
+        if self._clean is None:
+            self._clean = _clean(self.text)
+        return self._clean
+
+    @property
+    def normalized(self) -> str:
+        """ The same as fast_normalize(text) """
+        if self._normalized is None:
+            self._normalized = self.clean.replace('ё', 'е')
+        return self._normalized
+
+    @property
+    def tokens(self) -> List[str]:
+        return self.normalized.split()
+
+    @property
+    def lemmatized(self) -> str:
+        """ The same as fast_normalize(text, lemmatize=True) """
+        if self._lemmatized is None:
+            self._lemmatized = ' '.join([word2lemma(w) for w in self.clean.split()]).replace('ё', 'е')
+        return self._lemmatized
+
+    @property
+    def lemmas(self) -> List[str]:
+        return self.lemmatized.split()
+
+
+ANALYSIS_CACHE_SIZE = 16384
+_analysis_cache: Dict[str, AnalyzedText] = {}
+_analysis_cache_state = threading.local()
+
+
+@contextmanager
+def analysis_cache_disabled():
+    """ Within this context, the texts analyzed in the current thread are not put into the analysis cache.
+    It is used for the texts that are analyzed only once (e.g. the examples on which matchers are fitted),
+    so that they do not evict the analyses of the current requests.
+    """
+    disabled = getattr(_analysis_cache_state, 'disabled', False)
+    _analysis_cache_state.disabled = True
+    try:
+        yield
+    finally:
+        _analysis_cache_state.disabled = disabled
+
+
+def analyze(text: Union[str, AnalyzedText]) -> AnalyzedText:
+    """ Return the analysis of the text, shared between all the callers that analyze the same text """
+    if isinstance(text, AnalyzedText):
+        return text
+    result = _analysis_cache.get(text)
+    if result is None:
+        if getattr(_analysis_cache_state, 'disabled', False):
+            return AnalyzedText(text)
+        if len(_analysis_cache) >= ANALYSIS_CACHE_SIZE:
+            _analysis_cache.clear()
+        result = AnalyzedText(text)
+        _analysis_cache[text] = result
+        if result.clean == result.normalized and result.normalized != text:
+            # the normalized text is often analyzed again (e.g. by matchers), and its analysis is the same
+            _analysis_cache.setdefault(result.normalized, result)
+    return result
+
+
 def fast_normalize(text, lemmatize=False):
-    text = re.sub('[^a-zа-яё0-9]+', ' ', text.lower())
-    # todo: preserve floats
-    # we consider '-' as a delimiter, because it is often missing in results of ASR
-    text = re.sub('\\s+', ' ', text).strip()
+    analyzed = analyze(text)
     if lemmatize:
-        text = ' '.join([word2lemma(w) for w in text.split()])
-    text = re.sub('ё', 'е', text)
-    return text
+        return analyzed.lemmatized
+    return analyzed.normalized
+
+
+def normalize_batch(texts, lemmatize=False) -> List[str]:
+    """ The same as `fast_normalize` for each text, but faster for large corpora:
+    the texts are not put into the analysis cache, and each distinct word is looked up only once.
+    """
+    cleaned = [_clean(text.text if isinstance(text, AnalyzedText) else text) for text in texts]
+    if not lemmatize:
+        return [text.replace('ё', 'е') for text in cleaned]
+    lemmas = {}
+    result = []
+    for text in cleaned:
+        words = text.split()
+        for word in words:
+            if word not in lemmas:
+                lemmas[word] = word2lemma(word)
+        result.append(' '.join([lemmas[word] for word in words]).replace('ё', 'е'))
+    return result
 
 
 def like_help(text):
-    text = fast_normalize(text)
+    text = analyze(text).normalized
     return bool(re.match('^(алиса |яндекс )?(помощь|что ты (умеешь|можешь))$', text))
 
 
 def like_exit(text):
-    text = fast_normalize(text)
+    text = analyze(text).normalized
     return bool(re.match('^(алиса |яндекс )?(выход|хватит( болтать| играть)?|выйти|закончить)$', text))
 
 
 def like_yes(text):
-    text = fast_normalize(text)
+    text = analyze(text).normalized
     return bool(re.match('^(да|ага|окей|ок|конечно|yes|yep|хорошо|ладно)$', text))
 
 
 def like_no(text):
-    text = fast_normalize(text)
+    text = analyze(text).normalized
     return bool(re.match('^(нет|не|no|nope)$', text))
@@ -0,0 +1,164 @@
+"""
+This module groups the items coming from concurrent callers into batches, to process them together.
+It is used to run a neural encoder once for the queries of several concurrent requests.
+"""
+import math
+import queue
+import threading
+import time
+import typing
+
+from collections import Counter, deque
+
+
+class _Request:
+    __slots__ = ('item', 'created', 'done', 'result', 'error')
+
+    def __init__(self, item):
+        self.item = item
+        self.created = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """ Processes single items with a batch function, grouping the items from concurrent callers.
+
+    A background thread takes the first waiting item and collects the items that arrive during the next
+    `max_delay` seconds (but no more than `max_batch_size` of them). Then it calls `function` with the list
+    of the collected items, and each caller gets the corresponding element of the returned list
+    (or the exception raised by the function). Thus, `max_delay` is the latency budget that each caller
+    may spend waiting for the others.
+
+    Parameters
+    ----------
+    function: callable
+        Accepts a list of items and returns the list of results of the same length.
+    max_batch_size: int
+        The maximal number of items processed at once.
+    max_delay: float
+        The maximal time (in seconds) that the first item of a batch waits for the other items.
+    n_stats: int
+        The number of the most recent batches and items for which the batch sizes and delays are kept.
+    """
+    def __init__(self, function: typing.Callable, max_batch_size=32, max_delay=0.005, n_stats=10000):
+        self.function = function
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.n_stats = n_stats
+        self._init_runtime()
+
+    def _init_runtime(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=self.n_stats)
+        self._queue_delays = deque(maxlen=self.n_stats)
+        self._n_batches = 0
+        self._n_items = 0
+
+    def __getstate__(self):
+        # the thread and the queue are not saved; the restored batcher starts its own thread when it is called
+        return {
+            'function': self.function,
+            'max_batch_size': self.max_batch_size,
+            'max_delay': self.max_delay,
+            'n_stats': self.n_stats,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    def __call__(self, item):
+        """ Process a single item as a part of a batch and return its result """
+        self._start()
+        request = _Request(item)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name='MicroBatcher', daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def close(self):
+        """ Stop the background thread after it processes the items that are already waiting """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _collect(self, first) -> typing.Tuple[typing.List[_Request], bool]:
+        """ Collect a batch that starts with the given request; return it and whether the batcher is closed """
+        batch = [first]
+        deadline = first.created + self.max_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    request = self._queue.get(timeout=timeout)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        closed = False
+        while not closed:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, closed = self._collect(first)
+            started = time.perf_counter()
+            try:
+                results = self.function([request.item for request in batch])
+                if len(results) != len(batch):
+                    raise ValueError('The batch function returned {} results for {} items'.format(
+                        len(results), len(batch)
+                    ))
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            else:
+                for request, result in zip(batch, results):
+                    request.result = result
+            with self._lock:
+                self._n_batches += 1
+                self._n_items += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._queue_delays.extend(started - request.created for request in batch)
+            for request in batch:
+                request.done.set()
+
+    def stats(self) -> dict:
+        """ Return the number of processed batches and items, the distribution of batch sizes,
+        and the percentiles of the time (in milliseconds) that the items waited in the queue before processing.
+        The distributions are computed over the `n_stats` most recent batches and items.
+        """
+        with self._lock:
+            batch_sizes = list(self._batch_sizes)
+            delays = sorted(self._queue_delays)
+            result = {'n_batches': self._n_batches, 'n_items': self._n_items}
+        result['batch_sizes'] = dict(sorted(Counter(batch_sizes).items()))
+        result['mean_batch_size'] = sum(batch_sizes) / len(batch_sizes) if batch_sizes else None
+        for name, q in [('p50', 0.5), ('p99', 0.99), ('max', 1.0)]:
+            if delays:
+                result['queue_delay_ms_' + name] = 1000 * delays[min(len(delays) - 1, math.ceil(q * len(delays)) - 1)]
+            else:
+                result['queue_delay_ms_' + name] = None
+        return result
@@ -0,0 +1,244 @@
+"""
+This module contains indexes that help the matchers find the most similar examples
+without comparing the query with each example one by one.
+"""
+import random
+import typing
+import zlib
+
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# scipy.sparse is imported only when it is used, because it takes a lot of time and memory
+sparse = None
+_SPARSE_MISSING = np is None
+
+
+def import_sparse():
+    """ Import scipy.sparse and return it, or return None if numpy or scipy is not installed """
+    global sparse, _SPARSE_MISSING
+    if sparse is None and not _SPARSE_MISSING:
+        try:
+            from scipy import sparse
+        except ImportError:
+            _SPARSE_MISSING = True
+    return sparse
+
+
+class InvertedIndex:
+    """ Maps each token to the list of documents that contain it (postings), together with the token weights.
+    The dot product of a query with the documents is accumulated only over the documents that share
+    at least one token with the query. The squared norms of the documents are cached.
+    """
+    def __init__(self):
+        self.postings: typing.Dict[str, typing.List[typing.Tuple[int, float]]] = {}
+        self.norms: typing.List[float] = []
+
+    def __len__(self):
+        return len(self.norms)
+
+    def add(self, weights: typing.Mapping[str, float]) -> int:
+        """ Add a document represented by a dict of token weights and return its id """
+        doc_id = len(self.norms)
+        for token, weight in weights.items():
+            self.postings.setdefault(token, []).append((doc_id, weight))
+        self.norms.append(sum(v * v for v in weights.values()))
+        return doc_id
+
+    def dot(self, query: typing.Mapping[str, float]) -> typing.Dict[int, float]:
+        """ Return the dot products of the query with all the documents that have common tokens with it """
+        result = {}
+        for token, weight in query.items():
+            for doc_id, doc_weight in self.postings.get(token, ()):
+                result[doc_id] = result.get(doc_id, 0) + weight * doc_weight
+        return result
+
+
+class SparseMatrixIndex:
+    """ Stores the documents as rows of a CSR matrix (with numpy and scipy), with precomputed squared row norms.
+    The dot products of a query with all the documents are computed by a single sparse matrix-vector product.
+    The matrix is rebuilt lazily after new documents have been added.
+    """
+    def __init__(self):
+        if import_sparse() is None:
+            raise ImportError('When using SparseMatrixIndex, numpy and scipy should be installed')
+        self.vocab: typing.Dict[str, int] = {}
+        self._indptr = [0]
+        self._indices = []
+        self._data = []
+        self._norms = []
+        self._matrix = None
+        self.norms = None
+
+    def __len__(self):
+        return len(self._norms)
+
+    def add(self, weights: typing.Mapping[str, float]) -> int:
+        """ Add a document represented by a dict of token weights and return its id """
+        doc_id = len(self._norms)
+        for token, weight in weights.items():
+            self._indices.append(self.vocab.setdefault(token, len(self.vocab)))
+            self._data.append(weight)
+        self._indptr.append(len(self._indices))
+        self._norms.append(sum(v * v for v in weights.values()))
+        self._matrix = None
+        return doc_id
+
+    @property
+    def matrix(self):
+        if self._matrix is None:
+            self._matrix = sparse.csr_matrix(
+                (np.array(self._data, dtype=np.float64), self._indices, self._indptr),
+                shape=(len(self._norms), len(self.vocab)),
+            )
+            self.norms = np.array(self._norms, dtype=np.float64)
+        return self._matrix
+
+    def dot(self, query: typing.Mapping[str, float]):
+        """ Return a numpy array with the dot products of the query and each document """
+        matrix = self.matrix
+        vector = np.zeros(matrix.shape[1], dtype=np.float64)
+        for token, weight in query.items():
+            idx = self.vocab.get(token)
+            if idx is not None:
+                vector[idx] += weight
+        return matrix.dot(vector)
+
+    def dot_batch(self, queries: typing.List[typing.Mapping[str, float]]):
+        """ Return a dense numpy matrix with the dot products of each query (rows) and each document (columns) """
+        indptr = [0]
+        indices = []
+        data = []
+        for query in queries:
+            for token, weight in query.items():
+                idx = self.vocab.get(token)
+                if idx is not None:
+                    indices.append(idx)
+                    data.append(weight)
+            indptr.append(len(indices))
+        query_matrix = sparse.csr_matrix(
+            (np.array(data, dtype=np.float64), indices, indptr), shape=(len(queries), len(self.vocab)),
+        )
+        return query_matrix.dot(self.matrix.T).toarray()
+
+
+class NGramIndex:
+    """ Indexes sequences (e.g. strings) by their lengths and n-grams,
+    to quickly find the sequences that may be within a given edit distance from a query.
+
+    A sequence is a candidate only if its length is compatible with the allowed number of edits,
+    and if it shares enough n-grams with the query: each edit can destroy at most n of them.
+    With `infix=True`, the indexed sequences are searched as substrings of the query
+    (edits at the beginning and the end of the query are free).
+    """
+    def __init__(self, n=2):
+        self.n = n
+        self.lengths: typing.List[int] = []
+        self.buckets: typing.Dict[int, typing.List[int]] = {}
+        self.postings: typing.Dict[typing.Any, typing.List[typing.Tuple[int, int]]] = {}
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def _ngrams(self, sequence) -> Counter:
+        return Counter(tuple(sequence[i:(i + self.n)]) for i in range(len(sequence) - self.n + 1))
+
+    def add(self, sequence) -> int:
+        doc_id = len(self.lengths)
+        self.lengths.append(len(sequence))
+        self.buckets.setdefault(len(sequence), []).append(doc_id)
+        for ngram, count in self._ngrams(sequence).items():
+            self.postings.setdefault(ngram, []).append((doc_id, count))
+        return doc_id
+
+    def _overlaps(self, sequence) -> typing.Dict[int, int]:
+        """ For each indexed sequence, count the n-grams that it shares with the given one """
+        result = {}
+        for ngram, count in self._ngrams(sequence).items():
+            for doc_id, doc_count in self.postings.get(ngram, ()):
+                result[doc_id] = result.get(doc_id, 0) + min(count, doc_count)
+        return result
+
+    def candidates(self, sequence, max_distance: typing.Callable[[int, int], int], infix=False) -> typing.List[int]:
+        """ Return the sorted ids of the sequences that may be close enough to the given one.
+        `max_distance` computes the allowed edit distance from the lengths of the query and the indexed sequence.
+        """
+        query_len = len(sequence)
+        full_buckets = []
+        required_overlaps = {}
+        for length in self.buckets:
+            k = max_distance(query_len, length)
+            min_distance = max(0, length - query_len) if infix else abs(length - query_len)
+            if min_distance > k:
+                continue
+            reference_len = length if infix else max(length, query_len)
+            required = reference_len - self.n + 1 - k * self.n
+            if required <= 0:
+                full_buckets.append(length)
+            else:
+                required_overlaps[length] = required
+        result = [doc_id for length in full_buckets for doc_id in self.buckets[length]]
+        if required_overlaps:
+            for doc_id, overlap in self._overlaps(sequence).items():
+                required = required_overlaps.get(self.lengths[doc_id])
+                if required is not None and overlap >= required:
+                    result.append(doc_id)
+        return sorted(result)
+
+
+class MinHashLSHIndex:
+    """ An approximate index for Jaccard similarity of sets of strings, based on MinHash and banded LSH.
+
+    Each set is summarized by `bands * rows` minimal hash values, grouped into bands.
+    Two sets become candidates if all the values in at least one band coincide,
+    which happens with probability 1 - (1 - s ** rows) ** bands for sets with Jaccard similarity s.
+    Thus more bands increase recall, and more rows per band decrease the number of false candidates.
+    """
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self, bands=16, rows=4, seed=0):
+        self.bands = bands
+        self.rows = rows
+        rng = random.Random(seed)
+        self._coefficients = [
+            (rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME)) for _ in range(bands * rows)
+        ]
+        self.buckets: typing.List[typing.Dict[tuple, typing.List[int]]] = [{} for _ in range(bands)]
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def signature(self, tokens: typing.Iterable[str]) -> typing.Optional[typing.List[int]]:
+        # crc32 is used instead of hash(), because the latter is randomized for strings in each process
+        hashes = [zlib.crc32(str(token).encode('utf-8')) for token in tokens]
+        if not hashes:
+            return None
+        return [min((a * h + b) % self._PRIME for h in hashes) for a, b in self._coefficients]
+
+    def _band_keys(self, signature):
+        for i in range(self.bands):
+            yield i, tuple(signature[(i * self.rows):((i + 1) * self.rows)])
+
+    def add(self, tokens: typing.Iterable[str]) -> int:
+        doc_id = self._size
+        self._size += 1
+        signature = self.signature(tokens)
+        if signature is not None:
+            for i, key in self._band_keys(signature):
+                self.buckets[i].setdefault(key, []).append(doc_id)
+        return doc_id
+
+    def candidates(self, tokens: typing.Iterable[str]) -> typing.List[int]:
+        """ Return the sorted ids of the sets that collide with the given set in at least one band """
+        signature = self.signature(tokens)
+        if signature is None:
+            return []
+        result = set()
+        for i, key in self._band_keys(signature):
+            result.update(self.buckets[i].get(key, ()))
+        return sorted(result)
@@ -0,0 +1,121 @@
+"""
+This module stores precomputed lemmas of words in a read-only file that is memory-mapped by all the processes using it,
+so that the lemmas are neither recomputed nor copied into the memory of each process.
+
+The file is a hash table with open addressing:
+    - header: magic bytes, format version, the number of slots and the number of records;
+    - slots: for each slot, 0 if it is empty, or 1 + the offset of the record in the data section;
+    - data: the records, each being the lengths of the word and its lemma (uint16) followed by their UTF-8 bytes.
+"""
+import mmap
+import os
+import struct
+import tempfile
+import typing
+import zlib
+
+MAGIC = b'DLMT'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sIII')
+_SLOT = struct.Struct('<I')
+_RECORD = struct.Struct('<HH')
+_MAX_LENGTH = 2 ** 16 - 1
+
+
+def _n_slots(n_records):
+    n = 8
+    while n < 2 * n_records:
+        n *= 2
+    return n
+
+
+def write_lemma_table(path, word2lemma: typing.Mapping[str, str]):
+    """ Write the lemmas of the words into the file `path`.
+    The file is replaced atomically, so the processes that have mapped the old file can still use it.
+    """
+    items = [
+        (word.encode('utf-8'), lemma.encode('utf-8'))
+        for word, lemma in sorted(word2lemma.items())
+    ]
+    items = [(word, lemma) for word, lemma in items if len(word) <= _MAX_LENGTH and len(lemma) <= _MAX_LENGTH]
+    n_slots = _n_slots(len(items))
+    mask = n_slots - 1
+    slots = [0] * n_slots
+    data = bytearray()
+    for word, lemma in items:
+        slot = zlib.crc32(word) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = len(data) + 1
+        data += _RECORD.pack(len(word), len(lemma)) + word + lemma
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.lemmas-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, n_slots, len(items)))
+            f.write(struct.pack('<{}I'.format(n_slots), *slots))
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+class LemmaTable:
+    """ A read-only mapping from words to lemmas, memory-mapped from a file created by `write_lemma_table` """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._n_slots, self._n_records = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise ValueError('The file "{}" is not a lemma table of version {}'.format(path, FORMAT_VERSION))
+        self._mask = self._n_slots - 1
+        self._data_start = _HEADER.size + _SLOT.size * self._n_slots
+
+    def __len__(self):
+        return self._n_records
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def __getstate__(self):
+        # the processes that unpickle the table map the same file
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def get(self, word: str) -> typing.Optional[str]:
+        """ Return the lemma of the word, or None if the word is not in the table """
+        key = word.encode('utf-8')
+        slot = zlib.crc32(key) & self._mask
+        buffer = self._mmap
+        while True:
+            offset = _SLOT.unpack_from(buffer, _HEADER.size + _SLOT.size * slot)[0]
+            if not offset:
+                return None
+            start = self._data_start + offset - 1
+            word_len, lemma_len = _RECORD.unpack_from(buffer, start)
+            start += _RECORD.size
+            if word_len == len(key) and buffer[start:(start + word_len)] == key:
+                start += word_len
+                return buffer[start:(start + lemma_len)].decode('utf-8')
+            slot = (slot + 1) & self._mask
+
+    def items(self) -> typing.Iterator[typing.Tuple[str, str]]:
+        """ Iterate over the words and their lemmas in the table """
+        start = self._data_start
+        end = len(self._mmap)
+        while start < end:
+            word_len, lemma_len = _RECORD.unpack_from(self._mmap, start)
+            start += _RECORD.size
+            word = self._mmap[start:(start + word_len)].decode('utf-8')
+            start += word_len
+            yield word, self._mmap[start:(start + lemma_len)].decode('utf-8')
+            start += lemma_len
+
+    def close(self):
+        self._mmap.close()
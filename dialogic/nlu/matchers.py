@@ -1,4 +1,5 @@
 import math
+import os
 try:
     import edlib
 except ImportError:
@@ -6,23 +7,21 @@ except ImportError:
 
 import textdistance
 import re
+import threading
 import typing
 
 from collections import Counter, defaultdict
 from collections.abc import Callable, Iterable, Mapping
-from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from types import ModuleType
 
-from ..nlu import basic_nlu
+from ..nlu import basic_nlu, snapshots
 
-from .regex_utils import regex
-
-try:
-    from pyemd import emd
-    IMPORTED_EMD = True
-except ImportError:
-    emd = None
-    IMPORTED_EMD = False
+from .batching import MicroBatcher
+from .indexes import import_sparse, InvertedIndex, MinHashLSHIndex, NGramIndex, SparseMatrixIndex
+from .regex_utils import IntentRegexEngine, regex
+from .vectors import IVFIndex, VectorStorage, WordDistanceCache, top_k_indices
 
 try:
     import numpy as np
@@ -33,6 +32,37 @@ except ImportError:
 
 
 EPSILON = 1e-10
+_BATCHER_LOCK = threading.Lock()
+
+# pyemd is imported only when WMDMatcher is used, because it takes a lot of time to import
+emd = None
+
+
+def _import_emd():
+    global emd
+    if emd is None:
+        try:
+            from pyemd import emd
+        except ImportError:
+            raise ImportError('When using WMDMatcher, pyemd should be installed')
+    return emd
+
+
+def max_edit_distance(threshold, length):
+    """ The largest edit distance for which the similarity 1 - distance / length still reaches the threshold """
+    return math.floor((1 - threshold) * length + 1e-9)
+
+
+def _max_by_label(example_scores, example_labels):
+    """ Convert a matrix of scores (texts x examples) into a matrix of the highest scores (texts x labels) """
+    label2idx = {}
+    for label in example_labels:
+        label2idx.setdefault(label, len(label2idx))
+    result = np.full((example_scores.shape[0], len(label2idx)), -math.inf)
+    for j, label in enumerate(example_labels):
+        k = label2idx[label]
+        np.maximum(result[:, k], example_scores[:, j], out=result[:, k])
+    return result, list(label2idx)
 
 
 class TextNormalization:
@@ -40,8 +70,27 @@ class TextNormalization:
     FAST_LEMMATIZE = 'fast_lemmatize'
 
 
+class MatchingEngine:
+    """ The ways in which a matcher can search for the examples similar to the query """
+    PAIRWISE = 'pairwise'  # compare the query with each example
+    INVERTED = 'inverted'  # compare the query only with the examples that share a token with it
+    SPARSE = 'sparse'  # compare the query with all examples at once, as a sparse matrix (needs numpy and scipy)
+    MINHASH = 'minhash'  # compare the query only with the examples found by locality-sensitive hashing (approximate)
+    IVF = 'ivf'  # compare the query only with the examples from the closest clusters of vectors (approximate)
+
+
 class BaseMatcher:
     """ A base class for text classification with confidence """
+    # If True, get_scores may omit the labels whose scores are 0
+    sparse_scores = False
+    # The public attributes that hold the fitted state, rather than the configuration of the matcher
+    _state_attributes = ()
+    # The public attributes that affect only the speed of the matcher, but not its results
+    _runtime_attributes = ()
+    # The version of the fitted state of the class; it should be increased when the fitted attributes change,
+    # so that the snapshots saved by the previous versions of the class are not loaded
+    _snapshot_version = 1
+
     def __init__(self, threshold: float = 0.5, thresholds=None):
         """ Create a base matcher
         parameters:
@@ -68,11 +117,19 @@ class BaseMatcher:
     def get_threshold(self, label):
         return self.thresholds.get(label, self.threshold)
 
+    @property
+    def min_threshold(self):
+        """ The lowest of the thresholds for all labels """
+        return min([self.threshold] + list(self.thresholds.values()))
+
     def match(self, text: str, use_threshold=True):
         """ Return the label which is most similar to the text and its score.
         If no example is similar enough, the winner label will be None.
         """
-        scores, labels = self.get_scores(text)
+        if use_threshold:
+            scores, labels = self.get_scores_above(text, self.min_threshold)
+        else:
+            scores, labels = self.get_scores(text)
         best_score = -math.inf
         winner_label = None
         for score, label in zip(scores, labels):
@@ -85,15 +142,133 @@ class BaseMatcher:
         """ Return the list of matching scores and their corresponding labels """
         raise NotImplementedError()
 
+    def get_scores_above(self, text: str, threshold: float) -> typing.Tuple[typing.List[float], typing.List]:
+        """ Like get_scores, but the examples whose scores are surely below the threshold may be omitted """
+        return self.get_scores(text)
+
+    def get_labels(self) -> typing.List:
+        """ Return the list of all labels that the matcher can predict (possibly, empty if it is unknown) """
+        return []
+
+    def match_top_k(self, text: str, k=1, use_threshold=True) -> typing.List[typing.Tuple[typing.Any, float]]:
+        """ Return at most k best labels with their highest scores, sorted by decreasing score.
+        If `use_threshold` is True, only the labels with the scores above their thresholds are returned.
+        """
+        return self.aggregate_scores(text, use_threshold=use_threshold).most_common(k)
+
+    def get_scores_batch(self, texts: typing.List[str]):
+        """ Return a numpy matrix with the highest matching score of each label (columns) for each text (rows),
+        and the list of labels corresponding to the columns.
+        The scores that the matcher does not return are filled with -inf (or 0, for matchers with sparse scores).
+        """
+        if not IMPORTED_NUMPY:
+            raise ImportError('When using get_scores_batch, numpy should be installed')
+        label2idx = {label: i for i, label in enumerate(self.get_labels())}
+        rows = [self.aggregate_scores(text, use_threshold=False) for text in texts]
+        for row in rows:
+            for label in row:
+                label2idx.setdefault(label, len(label2idx))
+        result = np.full((len(texts), len(label2idx)), 0.0 if self.sparse_scores else -math.inf)
+        for i, row in enumerate(rows):
+            for label, score in row.items():
+                result[i, label2idx[label]] = score
+        return result, list(label2idx)
+
+    def match_batch(self, texts: typing.List[str], use_threshold=True) -> typing.List[typing.Tuple[typing.Any, float]]:
+        """ Return the results of `match` (the best label and its score) for each of the texts """
+        return [self.match(text, use_threshold=use_threshold) for text in texts]
+
+    def _match_matrix(self, scores, labels, use_threshold=True):
+        """ Find the best label for each row of the (texts x examples) score matrix, like `match` does """
+        if use_threshold:
+            thresholds = np.array([self.get_threshold(label) for label in labels], dtype=np.float64)
+            scores = np.where(scores >= thresholds, scores, -math.inf)
+        result = []
+        if not len(labels):
+            return [(None, -math.inf)] * len(scores)
+        for row, idx in zip(scores, np.argmax(scores, axis=1)):
+            if row[idx] == -math.inf:
+                result.append((None, -math.inf))
+            else:
+                result.append((labels[idx], float(row[idx])))
+        return result
+
     def aggregate_scores(self, text: str, use_threshold=True) -> Counter:
         """ Return a dict with the highest matching score for each label. """
         result = Counter()
-        scores, labels = self.get_scores(text)
+        if use_threshold:
+            scores, labels = self.get_scores_above(text, self.min_threshold)
+        else:
+            scores, labels = self.get_scores(text)
         for score, label in zip(scores, labels):
             if score >= self.get_threshold(label) or not use_threshold:
                 result[label] = max(score, result.get(label, -math.inf))
         return result
 
+    def get_config(self) -> dict:
+        """ Return a JSON-like description of the configuration of the matcher (but not of its fitted state) """
+        excluded = set(self._state_attributes).union(self._runtime_attributes).union(self._external_attributes())
+        result = {'class': type(self).__qualname__}
+        for key, value in self.__dict__.items():
+            if not key.startswith('_') and key not in excluded:
+                result[key] = value
+        return result
+
+    def _iter_matchers(self):
+        """ Iterate over this matcher and all the matchers nested in it """
+        yield self
+
+    def _external_attributes(self) -> typing.List[str]:
+        """ The attributes that are not saved in snapshots (e.g. large models or lambdas).
+        On loading, they are taken from the matcher into which the snapshot is loaded.
+        """
+        return []
+
+    def _snapshot_externals(self) -> typing.Dict[str, typing.Any]:
+        return {
+            '{}.{}'.format(i, name): getattr(matcher, name)
+            for i, matcher in enumerate(self._iter_matchers())
+            for name in matcher._external_attributes()
+        }
+
+    def _snapshot_hash(self, source_hash):
+        versions = sorted({
+            (cls.__qualname__, cls.__dict__['_snapshot_version'])
+            for matcher in self._iter_matchers()
+            for cls in type(matcher).__mro__
+            if '_snapshot_version' in cls.__dict__
+        })
+        return snapshots.source_hash(self.get_config(), source_hash, versions)
+
+    def save(self, path, source_hash: str = None):
+        """ Save the fitted matcher into the directory `path`, so that it could be restored by `load`.
+        The numpy arrays are saved as separate files, so that they can be memory-mapped on loading.
+        `source_hash` should describe the data on which the matcher was fitted (see `snapshots.source_hash`).
+        """
+        snapshots.save_snapshot(
+            self, path, source_hash=self._snapshot_hash(source_hash), externals=self._snapshot_externals(),
+        )
+
+    def load(self, path, source_hash: str = None) -> bool:
+        """ Restore the fitted state of the matcher from the directory `path`, created by `save`.
+        Return False and leave the matcher unchanged if there is no snapshot,
+        or if it was made with a different configuration of the matcher or a different `source_hash`.
+        """
+        loaded = snapshots.load_snapshot(
+            path, source_hash=self._snapshot_hash(source_hash), externals=self._snapshot_externals(),
+        )
+        if loaded is None:
+            return False
+        self._restore(loaded)
+        return True
+
+    def _restore(self, other):
+        if type(other) is not type(self):
+            raise TypeError('Cannot restore {} from a snapshot of {}'.format(type(self), type(other)))
+        runtime = {key: self.__dict__[key] for key in self._runtime_attributes if key in self.__dict__}
+        self.__dict__.update(other.__dict__)
+        self.__dict__.update(runtime)
+
 
 class ExtendableMatcher(BaseMatcher):
     """ Mixin for matchers that support partial_fit """
@@ -130,6 +305,27 @@ class AggregationMatcher(BaseMatcher):
         for m in self.matchers:
             m.fit(texts, labels)
 
+    def get_labels(self):
+        return list(dict.fromkeys(label for m in self.matchers for label in m.get_labels()))
+
+    def get_config(self):
+        result = super(AggregationMatcher, self).get_config()
+        result['matchers'] = [m.get_config() for m in self.matchers]
+        return result
+
+    def _iter_matchers(self):
+        yield self
+        for m in self.matchers:
+            yield from m._iter_matchers()
+
+    def _restore(self, other):
+        # the nested matchers are restored in place, because they may be referenced from outside
+        matchers = self.matchers
+        super(AggregationMatcher, self)._restore(other)
+        for m, loaded in zip(matchers, other.matchers):
+            m._restore(loaded)
+        self.matchers = matchers
+
     def get_scores(self, text: str) -> typing.Tuple[typing.List[float], typing.List]:
         scores = []
         labels = []
@@ -139,10 +335,13 @@ class AggregationMatcher(BaseMatcher):
             labels.extend(lbl)
         return scores, labels
 
-    def _apply_matchers(self, text, use_threshold=False):
+    def _apply_matchers(self, text, use_threshold=False, min_score=None):
         label2matchers2scores = defaultdict(lambda: defaultdict(lambda: -math.inf))
         for i, m in enumerate(self.matchers):
-            scores, labels = m.get_scores(text)
+            if min_score is None:
+                scores, labels = m.get_scores(text)
+            else:
+                scores, labels = m.get_scores_above(text, min_score)
             for label, score in zip(labels, scores):
                 if score > label2matchers2scores[label][i]:
                     if use_threshold and score < self.get_threshold(label):
@@ -153,7 +352,11 @@ class AggregationMatcher(BaseMatcher):
 
 class MaxMatcher(AggregationMatcher):
     def get_scores(self, text):
-        label2matchers2scores = self._apply_matchers(text)
+        return self.get_scores_above(text, None)
+
+    def get_scores_above(self, text, threshold):
+        # the maximal score can reach the threshold only if the score of some matcher reaches it
+        label2matchers2scores = self._apply_matchers(text, min_score=threshold)
         labels = []
         scores = []
         for label, ldict in label2matchers2scores.items():
@@ -179,12 +382,86 @@ class WeightedAverageMatcher(AggregationMatcher):
         labels = []
         scores = []
         for label, ldict in label2matchers2scores.items():
-            score = sum(w * ldict[i] for i, w in enumerate(self.weights))
+            score = sum(
+                w * (ldict[i] if i in ldict or not self.matchers[i].sparse_scores else 0.0)
+                for i, w in enumerate(self.weights)
+            )
             labels.append(label)
             scores.append(score)
         return scores, labels
 
 
+class TieredMatcher(AggregationMatcher):
+    """
+    Consult the matchers one by one (from the cheapest to the most expensive, e.g. exact, regex, tf-idf),
+    and stop as soon as some label gets a confident enough score, so the next matchers are not run.
+    The score of each label is its maximal score among the matchers that have been run.
+
+    Parameters
+    ----------
+    matchers: list
+        The tiers of matching, in the order in which they are consulted.
+    confidence: float or list
+        The score that is enough to stop after a tier (or a list of such scores for each tier).
+    kwargs:
+        Passed to the parent constructor (BaseMatcher)
+
+    For monitoring, `last_tier` is the index of the tier that gave the best score to the last matched text
+    (None, if this score is below the threshold), and `tier_stats` counts how many times each tier was the deciding one.
+    They are updated only by matching with thresholds (e.g. `match` or `aggregate_scores`),
+    and they are not restored from snapshots.
+    """
+    _state_attributes = ('last_tier', 'tier_stats')
+
+    def __init__(self, matchers, confidence=1.0, **kwargs):
+        super(TieredMatcher, self).__init__(matchers, **kwargs)
+        if not isinstance(confidence, (list, tuple)):
+            confidence = [confidence] * len(self.matchers)
+        assert len(confidence) == len(self.matchers), 'matchers and confidence levels should have the same size'
+        self.confidence = list(confidence)
+        self.last_tier = None
+        self.tier_stats = Counter()
+
+    def get_scores(self, text):
+        scores, labels, tier = self._get_tiered_scores(text, None)
+        return scores, labels
+
+    def get_scores_above(self, text, threshold):
+        scores, labels, tier = self._get_tiered_scores(text, threshold)
+        self.last_tier = tier
+        if tier is not None:
+            self.tier_stats[tier] += 1
+        return scores, labels
+
+    def _get_tiered_scores(self, text, threshold):
+        """ Return the scores, their labels, and the tier that gave the best score (if it is above the threshold) """
+        label2score = {}
+        label2tier = {}
+        for i, m in enumerate(self.matchers):
+            if threshold is None:
+                scores, labels = m.get_scores(text)
+            else:
+                scores, labels = m.get_scores_above(text, threshold)
+            for label, score in zip(labels, scores):
+                if score > label2score.get(label, -math.inf):
+                    label2score[label] = score
+                    label2tier[label] = i
+            if any(score >= self.confidence[i] for score in scores):
+                break
+        tier = None
+        if label2score:
+            best_label = max(label2score, key=label2score.get)
+            if label2score[best_label] >= self.get_threshold(best_label):
+                tier = label2tier[best_label]
+        return list(label2score.values()), list(label2score.keys()), tier
+
+    def _restore(self, other):
+        super(TieredMatcher, self)._restore(other)
+        # the monitoring counters of the process that saved the snapshot are not relevant
+        self.last_tier = None
+        self.tier_stats = Counter()
+
+
 class ModelBasedMatcher(BaseMatcher):
     """ Classify text using an old good sklearn-style model """
     def __init__(self, model, **kwargs):
@@ -199,19 +476,34 @@ class ModelBasedMatcher(BaseMatcher):
         labels = self.model.classes_
         return scores, labels
 
+    def get_labels(self):
+        return list(self.model.classes_)
+
+    def get_scores_batch(self, texts):
+        if not len(texts):
+            return np.zeros((0, len(self.model.classes_))), self.get_labels()
+        return np.asarray(self.model.predict_proba(texts), dtype=np.float64), self.get_labels()
+
+    def match_batch(self, texts, use_threshold=True):
+        scores, labels = self.get_scores_batch(texts)
+        return self._match_matrix(scores, labels, use_threshold=use_threshold)
+
 
 class RegexMatcher(BaseMatcher):
     """ This matcher returns matching score 1,
     if the text matches one of the provided expressions for the label, and 0 otherwise.
     The parameter `add_end` forcibly wraps each expression between `^` and `$` symbols, disabling partial prefix match.
+    All the expressions are checked in a single pass by an IntentRegexEngine,
+    which also extracts the forms (named groups) of the matched labels, see `match_forms`.
     """
+    _snapshot_version = 2
+
     def __init__(self, *args, add_end=True, merge=True, engine='re', **kwargs):
         super(RegexMatcher, self).__init__(*args, **kwargs)
         self.add_end = add_end
         self.merge = merge
-        self.expressions = []
-        self.labels = []
         self.engine = engine
+        self.regex_engine = IntentRegexEngine(add_end=self.add_end, merge=self.merge, re_module=self.re)
 
     @property
     def re(self):
@@ -221,40 +513,64 @@ class RegexMatcher(BaseMatcher):
             return self.engine
         return re
 
+    @property
+    def expressions(self):
+        return self.regex_engine.expressions
+
+    @property
+    def labels(self):
+        return self.regex_engine.labels
+
     def fit(self, texts, labels):
-        self.expressions = []
-        self.labels = []
+        self.regex_engine = IntentRegexEngine(add_end=self.add_end, merge=self.merge, re_module=self.re)
         self.partial_fit(texts=texts, labels=labels)
 
     def partial_fit(self, texts, labels):
-        parts = defaultdict(list)
-        for text, label in zip(texts, labels):
-            parts[label].append(text)
-        for label, expressions in parts.items():
-            if self.merge:
-                self.expressions.append(
-                    self.re.compile('(?:{})'.format(
-                        '|'.join([self._wrap(e) for e in expressions])
-                    ))
-                )
-                self.labels.append(label)
-            else:
-                for e in expressions:
-                    self.expressions.append(self.re.compile('(?:{})'.format(self._wrap(e))))
-                    self.labels.append(label)
-
-    def _wrap(self, text):
-        if self.add_end:
-            return '^{}$'.format(text)
-        return text
+        self.regex_engine.add(texts=texts, labels=labels)
 
     def get_scores(self, text):
-        scores = []
-        labels = []
-        for label, expression in zip(self.labels, self.expressions):
-            labels.append(label)
-            scores.append(float(bool(self.re.match(expression, text))))
-        return scores, labels
+        scores, forms = self.regex_engine.match(text, with_forms=False)
+        return scores, list(self.labels)
+
+    def match_forms(self, text) -> typing.Dict[str, typing.Dict]:
+        """ Return the named groups of the first matching expression for each label (matched as a prefix) """
+        scores, forms = self.regex_engine.match(text)
+        return forms
+
+    def get_labels(self):
+        return list(dict.fromkeys(self.labels))
+
+    def match_top_k(self, text, k=1, use_threshold=True):
+        if not use_threshold:
+            return super(RegexMatcher, self).match_top_k(text, k=k, use_threshold=use_threshold)
+        # the score 1 cannot be exceeded, so the search stops after the k-th matched label
+        labels = self.regex_engine.first_matches(text, k, accept=lambda label: self.get_threshold(label) <= 1)
+        return [(label, 1.0) for label in labels]
+
+    def _example_scores_batch(self, texts):
+        result = np.zeros((len(texts), len(self.labels)))
+        for i, matches in enumerate(self.regex_engine.match_batch(texts)):
+            result[i] = matches
+        return result
+
+    def get_scores_batch(self, texts):
+        return _max_by_label(self._example_scores_batch(texts), self.labels)
+
+    def match_batch(self, texts, use_threshold=True):
+        return self._match_matrix(self._example_scores_batch(texts), self.labels, use_threshold=use_threshold)
+
+
+_worker_matcher = None
+
+
+def _init_worker(matcher):
+    global _worker_matcher
+    _worker_matcher = matcher
+
+
+def _call_worker(method, texts):
+    with basic_nlu.analysis_cache_disabled():
+        return getattr(_worker_matcher, method)(texts)
 
 
 class PairwiseMatcher(ExtendableMatcher):
@@ -271,12 +587,34 @@ class PairwiseMatcher(ExtendableMatcher):
     stopwords: iterable or mapping
         Lists the words that should be discarded (if it is a list) or paid less attention
         (if it is a dict with values in (0, 1) during matching. It may not be supported by all descendant matchers.
+    preprocess_batch_size: int
+        The number of examples passed to `preprocess_batch` at once during fitting.
+        The descendants that wrap a neural encoder can override `preprocess_batch` to embed the examples in batches.
+    micro_batch_delay: float
+        If set, the queries from concurrent threads are preprocessed together by `preprocess_batch`:
+        each query waits for the other ones for at most this number of seconds (see MicroBatcher).
+    micro_batch_size: int
+        The maximal number of concurrent queries preprocessed at once, if `micro_batch_delay` is set.
+    n_jobs: int
+        If greater than 1, the chunks of examples are preprocessed during fitting in this number of processes
+        (-1 for the number of CPUs). The result is the same as with sequential fitting.
+        The matcher is copied into the worker processes (without pickling, if they are started by fork).
     kwargs:
         Passed to the parent constructor (BaseMatcher)
     """
-    def __init__(self, text_normalization=TextNormalization.FAST, stopwords=None, **kwargs):
+    _runtime_attributes = ('preprocess_batch_size', 'micro_batch_delay', 'micro_batch_size', 'n_jobs')
+
+    def __init__(
+            self, text_normalization=TextNormalization.FAST, stopwords=None, preprocess_batch_size=256,
+            micro_batch_delay=None, micro_batch_size=32, n_jobs=None, **kwargs
+    ):
         super(PairwiseMatcher, self).__init__(**kwargs)
         self.text_normalization = text_normalization
+        self.preprocess_batch_size = preprocess_batch_size
+        self.micro_batch_delay = micro_batch_delay
+        self.micro_batch_size = micro_batch_size
+        self.n_jobs = n_jobs
+        self._batcher = None
         self._texts = []
         self._labels = []
 
@@ -297,11 +635,71 @@ class PairwiseMatcher(ExtendableMatcher):
             text = self.text_normalization(text)
         return text
 
+    def _normalize_batch(self, texts) -> typing.List[str]:
+        """ The same as `PairwiseMatcher.preprocess` for each text """
+        if self.text_normalization in (TextNormalization.FAST, TextNormalization.FAST_LEMMATIZE):
+            return basic_nlu.normalize_batch(
+                texts, lemmatize=self.text_normalization == TextNormalization.FAST_LEMMATIZE,
+            )
+        return [PairwiseMatcher.preprocess(self, text) for text in texts]
+
+    def preprocess_batch(self, texts) -> list:
+        """ Preprocess a list of texts; equivalent to calling `preprocess` for each of them """
+        return [self.preprocess(text) for text in texts]
+
+    def _preprocess_in_chunks(self, texts, method='preprocess_batch') -> list:
+        """ Apply the method (given by name) that processes a list of texts to the chunks of the texts,
+        in parallel if `n_jobs` is set, and concatenate the results.
+        The texts are not put into the analysis cache, which is kept for the queries.
+        """
+        texts = list(texts)
+        size = max(self.preprocess_batch_size or len(texts), 1)
+        chunks = [texts[start:(start + size)] for start in range(0, len(texts), size)]
+        n_jobs = os.cpu_count() if self.n_jobs is not None and self.n_jobs < 0 else self.n_jobs
+        result = []
+        if n_jobs and n_jobs > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(
+                    max_workers=min(n_jobs, len(chunks)), initializer=_init_worker, initargs=(self,),
+            ) as executor:
+                for processed in executor.map(_call_worker, repeat(method), chunks):
+                    result.extend(processed)
+        else:
+            with basic_nlu.analysis_cache_disabled():
+                for chunk in chunks:
+                    result.extend(getattr(self, method)(chunk))
+        return result
+
+    def __getstate__(self):
+        # the batcher (with its thread) is not saved; a restored matcher creates its own one
+        state = self.__dict__.copy()
+        state.pop('_batcher', None)
+        return state
+
+    def _preprocess_query(self, text):
+        """ Preprocess a query, grouping it with the concurrent queries if micro-batching is enabled """
+        if not self.micro_batch_delay:
+            return self.preprocess(text)
+        batcher = getattr(self, '_batcher', None)
+        if batcher is None:
+            with _BATCHER_LOCK:
+                batcher = getattr(self, '_batcher', None)
+                if batcher is None:
+                    batcher = MicroBatcher(
+                        self.preprocess_batch, max_batch_size=self.micro_batch_size, max_delay=self.micro_batch_delay,
+                    )
+                    self._batcher = batcher
+        return batcher(text)
+
+    def micro_batch_stats(self) -> typing.Optional[dict]:
+        """ Return the batch sizes and queueing delays of the micro-batched queries (see MicroBatcher.stats) """
+        batcher = getattr(self, '_batcher', None)
+        return batcher.stats() if batcher is not None else None
+
     def compare(self, one, another):
         raise NotImplementedError()
 
     def partial_fit(self, texts, labels):
-        self._texts.extend([self.preprocess(text) for text in texts])
+        self._texts.extend(self._preprocess_in_chunks(texts))
         self._labels.extend(labels)
         return self
 
@@ -310,22 +708,91 @@ class PairwiseMatcher(ExtendableMatcher):
         self._labels = []
         return self
 
+    def _external_attributes(self):
+        if callable(self.text_normalization):
+            return ['text_normalization']
+        return []
+
     def get_scores(self, text):
-        processed = self.preprocess(text)
+        processed = self._preprocess_query(text)
         return [self.compare(processed, t) for t in self._texts], self._labels
 
+    def get_labels(self):
+        return list(dict.fromkeys(self._labels))
+
+    def _example_scores_batch(self, texts):
+        """ Return the matrix of scores of each text (rows) with each example (columns),
+        or None, if the matcher cannot compute it faster than by calling `get_scores` in a loop.
+        """
+        return None
+
+    def get_scores_batch(self, texts, batch_size=1024):
+        label_scores = []
+        for start in range(0, len(texts), batch_size):
+            example_scores = self._example_scores_batch(texts[start:(start + batch_size)])
+            if example_scores is None:
+                return super(PairwiseMatcher, self).get_scores_batch(texts)
+            label_scores.append(_max_by_label(example_scores, self._labels)[0])
+        labels = self.get_labels()
+        if not label_scores:
+            return np.zeros((0, len(labels))), labels
+        return np.concatenate(label_scores), labels
+
+    def match_batch(self, texts, use_threshold=True, batch_size=1024):
+        result = []
+        for start in range(0, len(texts), batch_size):
+            example_scores = self._example_scores_batch(texts[start:(start + batch_size)])
+            if example_scores is None:
+                return super(PairwiseMatcher, self).match_batch(texts, use_threshold=use_threshold)
+            result.extend(self._match_matrix(example_scores, self._labels, use_threshold=use_threshold))
+        return result
+
 
 class ExactMatcher(PairwiseMatcher):
+    """ Matches the text only with the examples that are equal to it after normalization.
+    The examples are indexed by their normalized texts, so matching takes constant time.
+    The scores are returned only for the matching labels; the scores of all other labels are implied to be 0.
+    """
+    sparse_scores = True
+
+    def __init__(self, **kwargs):
+        super(ExactMatcher, self).__init__(**kwargs)
+        self._index = {}
+
     def compare(self, one, another):
         return float(one == another)
 
+    def partial_fit(self, texts, labels):
+        n_old = len(self._texts)
+        super(ExactMatcher, self).partial_fit(texts, labels)
+        for processed, label in zip(self._texts[n_old:], self._labels[n_old:]):
+            self._index.setdefault(processed, []).append(label)
+        return self
+
+    def reset(self):
+        self._index = {}
+        return super(ExactMatcher, self).reset()
+
+    def get_scores(self, text):
+        labels = list(self._index.get(self.preprocess(text), []))
+        return [1.0] * len(labels), labels
+
 
 class TextDistanceMatcher(PairwiseMatcher):
-    def __init__(self, by_words=True, metric='cosine', **kwargs):
+    """
+    Compare texts (or their lists of words, if `by_words` is True) by a normalized similarity from textdistance.
+
+    If the metric is 'levenshtein' and `use_index` is True, the examples are indexed by length and character
+    n-grams, so that only the examples that can reach the threshold are compared with the query.
+    """
+    def __init__(self, by_words=True, metric='cosine', use_index=True, **kwargs):
         super(TextDistanceMatcher, self).__init__(**kwargs)
         self.by_words = by_words
         self.metric = metric
         self.fun = getattr(textdistance, metric).normalized_similarity
+        self.use_index = use_index
+        self._index = None
+        self.reset()
 
     def preprocess(self, text):
         text = super(TextDistanceMatcher, self).preprocess(text)
@@ -336,6 +803,43 @@ class TextDistanceMatcher(PairwiseMatcher):
     def compare(self, one, another):
         return self.fun(one, another)
 
+    def partial_fit(self, texts, labels):
+        n_old = len(self._texts)
+        super(TextDistanceMatcher, self).partial_fit(texts, labels)
+        if self._index is not None:
+            for processed in self._texts[n_old:]:
+                self._index.add(processed)
+        return self
+
+    def reset(self):
+        if self.use_index and self.metric == 'levenshtein':
+            self._index = NGramIndex()
+        return super(TextDistanceMatcher, self).reset()
+
+    def get_scores_above(self, text, threshold):
+        if self._index is None or threshold <= 0:
+            return self.get_scores(text)
+        processed = self.preprocess(text)
+        candidates = self._index.candidates(
+            processed, max_distance=lambda len1, len2: max_edit_distance(threshold, max(len1, len2)),
+        )
+        scores = []
+        labels = []
+        for doc_id in candidates:
+            another = self._texts[doc_id]
+            if edlib is not None and isinstance(processed, str):
+                length = max(len(processed), len(another))
+                k = max_edit_distance(threshold, length)
+                distance = edlib.align(processed, another, mode='NW', k=k)['editDistance']
+                if distance < 0:
+                    continue
+                score = 1 - distance / length if length else 1
+            else:
+                score = self.compare(processed, another)
+            scores.append(score)
+            labels.append(self._labels[doc_id])
+        return scores, labels
+
 
 class LevenshteinMatcher(TextDistanceMatcher):
     def __init__(self, **kwargs):
@@ -345,7 +849,10 @@ class LevenshteinMatcher(TextDistanceMatcher):
 
 
 class EdlibMatcher(PairwiseMatcher):
-    """ Matches by edit distance relative to the reference text. """
+    """ Matches by edit distance relative to the reference text.
+    The examples are indexed by length and character n-grams, and the edit distance is computed
+    (with an upper bound) only for the examples that can reach the threshold.
+    """
     def __init__(self, ignore_suffix=True, ignore_prefix=True, **kwargs):
         super(EdlibMatcher, self).__init__(**kwargs)
         if edlib is None:
@@ -361,6 +868,7 @@ class EdlibMatcher(PairwiseMatcher):
             self.strategy = 'HW'
         else:
             self.strategy = 'NW'
+        self._index = NGramIndex()
 
     def preprocess(self, text):
         text = super(EdlibMatcher, self).preprocess(text)
@@ -373,8 +881,72 @@ class EdlibMatcher(PairwiseMatcher):
         x = edlib.align(another, one, mode=self.strategy)
         return 1 - x['editDistance'] / max(min(len(one), len(another)), 1)
 
+    def partial_fit(self, texts, labels):
+        n_old = len(self._texts)
+        super(EdlibMatcher, self).partial_fit(texts, labels)
+        for processed in self._texts[n_old:]:
+            self._index.add(processed)
+        return self
+
+    def reset(self):
+        self._index = NGramIndex()
+        return super(EdlibMatcher, self).reset()
+
+    def get_scores_above(self, text, threshold):
+        if threshold <= 0:
+            return self.get_scores(text)
+        processed = self.preprocess(text)
+
+        def max_distance(query_len, example_len):
+            return max_edit_distance(threshold, max(min(query_len, example_len), 1))
+
+        candidates = self._index.candidates(processed, max_distance=max_distance, infix=self.strategy != 'NW')
+        scores = []
+        labels = []
+        for doc_id in candidates:
+            another = self._texts[doc_id]
+            length = max(min(len(processed), len(another)), 1)
+            k = max_edit_distance(threshold, length)
+            distance = edlib.align(another, processed, mode=self.strategy, k=k)['editDistance']
+            if distance < 0:
+                continue
+            scores.append(1 - distance / length)
+            labels.append(self._labels[doc_id])
+        return scores, labels
+
 
 class JaccardMatcher(PairwiseMatcher):
+    """
+    Compare texts by Jaccard similarity of their sets of words.
+
+    Parameters
+    ----------
+    engine: string
+        'pairwise' (default) to compare the query with each example; 'sparse' to store the examples
+        as a binary sparse matrix and score all of them with a single matrix-vector product.
+        If numpy or scipy are not installed, the 'sparse' engine falls back to 'pairwise'.
+        'minhash' to compare the query only with the examples that collide with it in MinHash LSH buckets;
+        this is approximate, and the scores of the other examples are implied to be 0.
+    lsh_bands: int
+        The number of LSH bands for the 'minhash' engine; more bands increase recall and decrease speed.
+    lsh_rows: int
+        The number of MinHash values in each band; more rows decrease the number of candidates (and recall).
+    kwargs:
+        Passed to the parent constructor (PairwiseMatcher)
+    """
+    def __init__(self, engine=MatchingEngine.PAIRWISE, lsh_bands=16, lsh_rows=4, **kwargs):
+        super(JaccardMatcher, self).__init__(**kwargs)
+        if engine not in {MatchingEngine.PAIRWISE, MatchingEngine.SPARSE, MatchingEngine.MINHASH}:
+            raise ValueError('Unsupported JaccardMatcher engine: "{}"'.format(engine))
+        if engine == MatchingEngine.SPARSE and import_sparse() is None:
+            engine = MatchingEngine.PAIRWISE
+        self.engine = engine
+        self.sparse_scores = engine == MatchingEngine.MINHASH
+        self.lsh_bands = lsh_bands
+        self.lsh_rows = lsh_rows
+        self._index = None
+        self.reset()
+
     def preprocess(self, text):
         text = super(JaccardMatcher, self).preprocess(text)
         return set(text.split())
@@ -386,32 +958,246 @@ class JaccardMatcher(PairwiseMatcher):
             return intersection / union
         return 0.0
 
+    def partial_fit(self, texts, labels):
+        n_old = len(self._texts)
+        super(JaccardMatcher, self).partial_fit(texts, labels)
+        if self.engine == MatchingEngine.SPARSE:
+            for processed in self._texts[n_old:]:
+                self._index.add(dict.fromkeys(processed, 1))
+        elif self.engine == MatchingEngine.MINHASH:
+            for processed in self._texts[n_old:]:
+                self._index.add(processed)
+        return self
+
+    def reset(self):
+        if self.engine == MatchingEngine.SPARSE:
+            self._index = SparseMatrixIndex()
+        elif self.engine == MatchingEngine.MINHASH:
+            self._index = MinHashLSHIndex(bands=self.lsh_bands, rows=self.lsh_rows)
+        return super(JaccardMatcher, self).reset()
+
+    def get_scores(self, text):
+        if self._index is None:
+            return super(JaccardMatcher, self).get_scores(text)
+        processed = self.preprocess(text)
+        if self.engine == MatchingEngine.MINHASH:
+            candidates = self._index.candidates(processed)
+            return [self.compare(processed, self._texts[i]) for i in candidates], [self._labels[i] for i in candidates]
+        if not len(self._index):
+            return [], self._labels
+        intersections = self._index.dot(dict.fromkeys(processed, 1))
+        unions = self._index.norms + len(processed) - intersections
+        scores = np.where(intersections > 0, intersections / np.maximum(unions, 1), 0.0)
+        return scores.tolist(), self._labels
+
+    def measure_recall(self, texts) -> float:
+        """ Among the texts that have a match above the threshold, return the share of those
+        for which the current engine finds a match with the same score as the exact comparison with all examples.
+        """
+        relevant = 0
+        hits = 0
+        for text in texts:
+            processed = self.preprocess(text)
+            exact_score = -math.inf
+            for another, label in zip(self._texts, self._labels):
+                score = self.compare(processed, another)
+                if score >= self.get_threshold(label):
+                    exact_score = max(exact_score, score)
+            if exact_score == -math.inf:
+                continue
+            relevant += 1
+            if self.match(text)[1] == exact_score:
+                hits += 1
+        if not relevant:
+            return 1.0
+        return hits / relevant
+
 
 class TFIDFMatcher(PairwiseMatcher):
-    def __init__(self, smooth=2.0, ngram=1, **kwargs):
+    """
+    Compare texts by cosine similarity of their bag-of-words vectors with TF-IDF weighting.
+
+    Parameters
+    ----------
+    smooth: float
+        The constant added to the word counts before taking their logarithm as the inverse document frequency.
+    ngram: int
+        If greater than 1, word n-grams of this size are used as additional tokens.
+    engine: string
+        'inverted' (default) to score only the examples that share at least one token with the query,
+        using an inverted index; 'sparse' to store the examples as a sparse matrix and score them all
+        with a single matrix-vector product; 'pairwise' to compare the query with each example.
+        If numpy or scipy are not installed, the 'sparse' engine falls back to 'inverted'.
+    kwargs:
+        Passed to the parent constructor (PairwiseMatcher)
+    """
+    _state_attributes = ('vocab',)
+
+    def __init__(self, smooth=2.0, ngram=1, engine=MatchingEngine.INVERTED, **kwargs):
         super(TFIDFMatcher, self).__init__(**kwargs)
+        if engine not in {MatchingEngine.PAIRWISE, MatchingEngine.INVERTED, MatchingEngine.SPARSE}:
+            raise ValueError('Unsupported TFIDFMatcher engine: "{}"'.format(engine))
+        if engine == MatchingEngine.SPARSE and import_sparse() is None:
+            engine = MatchingEngine.INVERTED
         self.smooth = smooth
         self.ngram = ngram
         self.vocab = Counter()
+        self.engine = engine
+        self._index = None
+        self._batch_index = None
+        self.reset()
 
-    def fit(self, texts, labels):
-        self.vocab = Counter(w for t in texts for w in self._tokenize(super(TFIDFMatcher, self).preprocess(t)))
-        return super(TFIDFMatcher, self).fit(texts, labels)
+    def partial_fit(self, texts, labels):
+        # the examples are stored as raw term frequencies, and the IDF weights are applied at scoring time,
+        # so new examples update the vocabulary without recomputing the old ones
+        term_frequencies = self._preprocess_in_chunks(texts, method='_term_frequencies_batch')
+        for tf in term_frequencies:
+            self.vocab.update(tf)
+            if self._index is not None:
+                self._index.add(tf)
+        self._texts.extend(term_frequencies)
+        self._labels.extend(labels)
+        self._doc_norms = {}
+        self._sparse_weights = None
+        return self
 
-    def preprocess(self, text):
-        text = super(TFIDFMatcher, self).preprocess(text)
-        tf = Counter(self._tokenize(text))
+    def reset(self):
+        self.vocab = Counter()
+        if self.engine == MatchingEngine.INVERTED:
+            self._index = InvertedIndex()
+        elif self.engine == MatchingEngine.SPARSE:
+            self._index = SparseMatrixIndex()
+        self._batch_index = None
+        self._doc_norms = {}
+        self._sparse_weights = None
+        return super(TFIDFMatcher, self).reset()
+
+    def _term_frequencies(self, text):
+        return Counter(self._tokenize(super(TFIDFMatcher, self).preprocess(text)))
+
+    def _term_frequencies_batch(self, texts):
+        return [Counter(self._tokenize(text)) for text in self._normalize_batch(texts)]
+
+    def _weights(self, term_frequencies):
         return {
             w: tf / math.log(self.smooth + self.vocab[w]) * self.stopwords.get(w, 1)
-            for w, tf in tf.items()
+            for w, tf in term_frequencies.items()
         }
 
+    def preprocess(self, text):
+        return self._weights(self._term_frequencies(text))
+
+    def _doc_norm(self, doc_id):
+        norm = self._doc_norms.get(doc_id)
+        if norm is None:
+            norm = self._norm(self._weights(self._texts[doc_id]))
+            self._doc_norms[doc_id] = norm
+        return norm
+
+    def _inverted_dots(self, query, tokens):
+        """ Accumulate the dot products of the query with the examples over the postings of the given tokens """
+        result = {}
+        for token in tokens:
+            postings = self._index.postings.get(token)
+            if not postings:
+                continue
+            weight = query[token]
+            log_df = math.log(self.smooth + self.vocab[token])
+            stopword_weight = self.stopwords.get(token, 1)
+            for doc_id, tf in postings:
+                result[doc_id] = result.get(doc_id, 0) + weight * (tf / log_df * stopword_weight)
+        return result
+
+    def _get_sparse_weights(self, index):
+        """ Return the IDF weights of the columns of the sparse index, and the norms of its weighted rows """
+        if self._sparse_weights is None or self._sparse_weights[0] is not index \
+                or self._sparse_weights[1] != len(index):
+            idf = np.zeros(len(index.vocab), dtype=np.float64)
+            for token, idx in index.vocab.items():
+                idf[idx] = 1 / math.log(self.smooth + self.vocab[token]) * self.stopwords.get(token, 1)
+            matrix = index.matrix
+            norms = np.asarray(matrix.multiply(matrix).dot(idf ** 2)).ravel()
+            self._sparse_weights = (index, len(index), idf, norms)
+        return self._sparse_weights[2], self._sparse_weights[3]
+
+    def _sparse_query(self, index, query, idf):
+        return {w: v * idf[index.vocab[w]] for w, v in query.items() if w in index.vocab}
+
+    def get_scores(self, text):
+        processed = self.preprocess(text)
+        query_norm = self._norm(processed)
+        if self.engine == MatchingEngine.SPARSE:
+            if not len(self._index):
+                return [], self._labels
+            idf, norms = self._get_sparse_weights(self._index)
+            dots = self._index.dot(self._sparse_query(self._index, processed, idf))
+            is_close = np.abs(dots) < 1e-6
+            scores = np.where(is_close, 0.0, dots / np.sqrt(np.maximum(query_norm * norms, EPSILON)))
+            return scores.tolist(), self._labels
+        if self.engine == MatchingEngine.PAIRWISE:
+            return [self.compare(processed, self._weights(tf)) for tf in self._texts], self._labels
+        scores = [0.0] * len(self._texts)
+        for doc_id, dot in self._inverted_dots(processed, processed).items():
+            if abs(dot) >= 1e-6:
+                scores[doc_id] = dot / math.sqrt(query_norm * self._doc_norm(doc_id))
+        return scores, self._labels
+
     def compare(self, one, another):
         dot = self._dot(one, another)
         if abs(dot) < 1e-6:
             return 0.0
         return dot / math.sqrt(self._norm(one) * self._norm(another))
 
+    def get_scores_above(self, text, threshold):
+        if self.engine != MatchingEngine.INVERTED or threshold <= 0:
+            return self.get_scores(text)
+        processed = self.preprocess(text)
+        query_norm = self._norm(processed)
+        if query_norm == 0:
+            return [], []
+        # The contribution of a token to the cosine similarity is at most its share in the normalized query.
+        # The tokens with the lowest shares, whose sum is below the threshold, are not traversed (MaxScore):
+        # an example that has only these tokens in common with the query cannot reach the threshold.
+        essential = sorted(processed, key=lambda w: abs(processed[w]))
+        skipped_bound = 0.0
+        while essential and skipped_bound + abs(processed[essential[0]]) / math.sqrt(query_norm) < threshold - 1e-9:
+            skipped_bound += abs(processed[essential.pop(0)]) / math.sqrt(query_norm)
+        essential = set(essential)
+        scores = []
+        labels = []
+        for doc_id, dot in sorted(self._inverted_dots(processed, [w for w in processed if w in essential]).items()):
+            doc_norm = self._doc_norm(doc_id)
+            if doc_norm == 0 or dot / math.sqrt(query_norm * doc_norm) + skipped_bound < threshold - 1e-9:
+                continue
+            if skipped_bound:
+                dot = self._dot(processed, self._weights(self._texts[doc_id]))
+            if abs(dot) >= 1e-6:
+                scores.append(dot / math.sqrt(query_norm * doc_norm))
+                labels.append(self._labels[doc_id])
+        return scores, labels
+
+    def _example_scores_batch(self, texts):
+        if import_sparse() is None:
+            return None
+        if self.engine == MatchingEngine.SPARSE:
+            index = self._index
+        else:
+            # the inverted index is good for single queries, but for a batch a sparse matrix product is faster
+            if self._batch_index is None or len(self._batch_index) != len(self._texts):
+                if self._batch_index is None:
+                    self._batch_index = SparseMatrixIndex()
+                for tf in self._texts[len(self._batch_index):]:
+                    self._batch_index.add(tf)
+            index = self._batch_index
+        processed = [self.preprocess(text) for text in texts]
+        if not len(index):
+            return np.zeros((len(texts), 0))
+        idf, norms = self._get_sparse_weights(index)
+        dots = index.dot_batch([self._sparse_query(index, p, idf) for p in processed])
+        query_norms = np.array([self._norm(p) for p in processed], dtype=np.float64)
+        denominators = np.sqrt(np.maximum(np.outer(query_norms, norms), EPSILON))
+        return np.where(np.abs(dots) < 1e-6, 0.0, dots / denominators)
+
     def _tokenize(self, text):
         words = text.split()
         if self.ngram == 1:
@@ -427,13 +1213,174 @@ class TFIDFMatcher(PairwiseMatcher):
         return self._dot(one, one)
 
 
-class W2VMatcher(PairwiseMatcher):
+class EmbeddingMatcher(PairwiseMatcher):
+    """
+    Compare texts by cosine similarity of their embeddings.
+    This is an abstract class; its descendants should implement `preprocess` that converts a text
+    into a normalized numpy vector (or None, if the text cannot be embedded).
+
+    The embeddings of all the examples are stored in a single matrix, so a query is compared with all of them
+    by one matrix-vector product.
+
+    Parameters
+    ----------
+    dtype: string or numpy dtype
+        The type in which the example embeddings are stored, 'float32' by default.
+        The compact types 'float16' and 'int8' (with a scale for each vector) take 2 and 4 times less memory,
+        at the cost of small errors in the scores (see VectorStorage).
+    engine: string
+        'pairwise' (default) to compare the query with all examples; 'ivf' to compare it only with the examples
+        from the `n_probe` closest clusters of an IVFIndex (this is approximate, and the scores of the other
+        examples are implied to be 0). The index is built when there are at least `ivf_min_size` examples.
+        The batch methods (`get_scores_batch` and `match_batch`) always compare the texts with all the examples,
+        because a matrix product is fast enough, so their results are exact with any engine.
+    n_lists: int
+        The number of clusters for the 'ivf' engine; by default, the square root of the number of examples.
+    n_probe: int
+        The number of clusters searched by the 'ivf' engine; more probes increase recall and decrease speed.
+    kwargs:
+        Passed to the parent constructor (PairwiseMatcher)
+    """
+    def __init__(
+            self, dtype='float32', engine=MatchingEngine.PAIRWISE, n_lists=None, n_probe=8, ivf_min_size=1024,
+            **kwargs
+    ):
+        if not IMPORTED_NUMPY:
+            raise ImportError('When using {}, numpy should be installed'.format(self.__class__.__name__))
+        if engine not in {MatchingEngine.PAIRWISE, MatchingEngine.IVF}:
+            raise ValueError('Unsupported {} engine: "{}"'.format(self.__class__.__name__, engine))
+        super(EmbeddingMatcher, self).__init__(**kwargs)
+        self.dtype = dtype
+        self.engine = engine
+        self.sparse_scores = engine == MatchingEngine.IVF
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.ivf_min_size = ivf_min_size
+        self.reset()
+
+    def partial_fit(self, texts, labels):
+        self._vectors.extend(self._preprocess_in_chunks(texts))
+        self._labels.extend(labels)
+        if self._index is not None:
+            self._index.update()
+        return self
+
+    def reset(self):
+        self._vectors = VectorStorage(dtype=self.dtype)
+        self._index = None
+        if self.engine == MatchingEngine.IVF:
+            self._index = IVFIndex(
+                self._vectors, n_lists=self.n_lists, n_probe=self.n_probe, min_size=self.ivf_min_size,
+            )
+        return super(EmbeddingMatcher, self).reset()
+
+    def compare(self, one, another):
+        if one is None or another is None:
+            return 0
+        return sum(one * another)
+
+    def _score_vector(self, text):
+        """ Return a numpy array with the similarities of the text to all the examples """
+        processed = self._preprocess_query(text)
+        if processed is None:
+            return np.zeros(len(self._vectors), dtype=self._vectors.compute_dtype)
+        return self._vectors.dot(processed)
+
+    def _candidate_scores(self, text):
+        """ Return the ids of the examples that are compared with the text (or None for all), and their scores """
+        processed = self._preprocess_query(text)
+        ids = None if processed is None or self._index is None else self._index.search(processed)
+        if ids is None:
+            if processed is None:
+                return None, np.zeros(len(self._vectors), dtype=self._vectors.compute_dtype)
+            return None, self._vectors.dot(processed)
+        return ids, self._vectors.take(ids).dot(np.asarray(processed, dtype=self._vectors.compute_dtype))
+
+    def get_scores(self, text):
+        ids, scores = self._candidate_scores(text)
+        if ids is None:
+            return scores.tolist(), self._labels
+        return scores.tolist(), [self._labels[i] for i in ids]
+
+    def match(self, text: str, use_threshold=True):
+        if self.thresholds:
+            return super(EmbeddingMatcher, self).match(text, use_threshold=use_threshold)
+        ids, scores = self._candidate_scores(text)
+        if not len(scores):
+            return None, -math.inf
+        best = int(np.argmax(scores))
+        best_score = float(scores[best])
+        if use_threshold and best_score < self.threshold:
+            return None, -math.inf
+        return self._labels[best if ids is None else ids[best]], best_score
+
+    def _example_scores_batch(self, texts):
+        # the batches are compared with all the examples even with the 'ivf' engine, because it is fast enough
+        if not len(self._vectors):
+            return np.zeros((len(texts), 0))
+        queries = VectorStorage(dtype=self._vectors.compute_dtype)
+        queries.extend(self.preprocess_batch(texts))
+        if not len(texts) or queries.dim is None:
+            return np.zeros((len(texts), len(self._vectors)))
+        return self._vectors.dot_matrix(queries.matrix)
+
+    def match_top_k(self, text, k=1, use_threshold=True):
+        ids, scores = self._candidate_scores(text)
+        n_examples = k
+        while True:
+            result = []
+            seen = set()
+            # the best score of each label is the first one to appear in the sorted list of examples
+            for i in top_k_indices(scores, n_examples):
+                label = self._labels[i if ids is None else ids[i]]
+                score = float(scores[i])
+                if use_threshold and score < self.min_threshold:
+                    return result
+                if label in seen or (use_threshold and score < self.get_threshold(label)):
+                    continue
+                seen.add(label)
+                result.append((label, score))
+                if len(result) >= k:
+                    return result
+            if n_examples >= len(scores):
+                return result
+            n_examples *= 2
+
+    def nearest(self, text: str, k=10) -> typing.List[typing.Tuple[typing.Any, float]]:
+        """ Return the labels and scores of the k examples most similar to the text, best first """
+        ids, scores = self._candidate_scores(text)
+        return [(self._labels[i if ids is None else ids[i]], float(scores[i])) for i in top_k_indices(scores, k)]
+
+    def measure_recall(self, texts) -> float:
+        """ Among the texts that have a match above the threshold, return the share of those
+        for which the current engine finds a match with the same score as the exact comparison with all examples.
+        """
+        relevant = 0
+        hits = 0
+        thresholds = np.array([self.get_threshold(label) for label in self._labels])
+        for text in texts:
+            scores = self._score_vector(text)
+            exact_scores = scores[scores >= thresholds]
+            if not len(exact_scores):
+                continue
+            relevant += 1
+            if self.match(text)[1] == float(exact_scores.max()):
+                hits += 1
+        if not relevant:
+            return 1.0
+        return hits / relevant
+
+
+class W2VMatcher(EmbeddingMatcher):
     """ Compare texts by cosine similarity of their mean word vectors """
     def __init__(self, w2v, normalize_word_vec=True, **kwargs):
         super(W2VMatcher, self).__init__(**kwargs)
         self.w2v = w2v
         self.normalize_word_vec = normalize_word_vec
 
+    def _external_attributes(self):
+        return super(W2VMatcher, self)._external_attributes() + ['w2v']
+
     def vec_from_word(self, word):
         vec = self.w2v[word]
         if self.normalize_word_vec:
@@ -450,38 +1397,54 @@ class W2VMatcher(PairwiseMatcher):
         result = result / max(sum(result**2), EPSILON) ** 0.5
         return result
 
-    def compare(self, one, another):
-        if one is None or another is None:
-            return 0
-        return sum(one * another)
-
 
 class WMDDocument:
     def __init__(self, text, tokens, vecs, weights):
         self.text = text
         self.tokens = tokens
         self.vecs = vecs
-        self.weights = weights
+        self.weights = weights  # normalized frequencies of the unique tokens
+        self.unique_tokens = list(dict.fromkeys(tokens))
+        token2vec = dict(zip(tokens, vecs))
+        self.unique_vecs = np.array([token2vec[t] for t in self.unique_tokens], dtype=np.double)
+        self.centroid = np.dot(weights, self.unique_vecs)
 
 
 class WMDMatcher(PairwiseMatcher):
     """
     Compare texts by Word Mover Distance between them .
 
+    To find the best match faster, the matcher first computes cheap lower bounds of the distance
+    (the distance between word centroids and the relaxed WMD) to all examples at once,
+    and then runs the exact EMD only for the examples that can still beat the current best match or the threshold.
+    The distances between query words and example words are cached across calls;
+    `distance_cache_size` limits the number of cached word pairs.
+    The vectors of the example words are stored only once, with the given `dtype`;
+    the compact types 'float16' and 'int8' save memory at the cost of small errors in the distances.
+    The word centroids of the examples are stored as float32 (or as `dtype`, if it is not compact),
+    and the rounding errors of the stored centroids and word vectors are subtracted from the centroid distances,
+    so the pruning never skips a better match.
+
     When using this code, please consider citing the following papers:
         .. Ofir Pele and Michael Werman, "A linear time histogram metric for improved SIFT matching".
         .. Ofir Pele and Michael Werman, "Fast and robust earth mover's distances".
         .. Matt Kusner et al. "From Word Embeddings To Document Distances".
     """
+    _snapshot_version = 2
 
-    def __init__(self, w2v, normalize_word_vec=True, **kwargs):
+    def __init__(self, w2v, normalize_word_vec=True, distance_cache_size=1000000, dtype='float64', **kwargs):
         if not IMPORTED_NUMPY:
             raise ImportError('When using WMDMatcher, numpy should be installed')
-        if not IMPORTED_EMD:
-            raise ImportError('When using WMDMatcher, pyemd should be installed')
+        _import_emd()
         super(WMDMatcher, self).__init__(**kwargs)
         self.w2v = w2v
         self.normalize_word_vec = normalize_word_vec
+        self.distance_cache_size = distance_cache_size
+        self.dtype = dtype
+        self.reset()
+
+    def _external_attributes(self):
+        return super(WMDMatcher, self)._external_attributes() + ['w2v']
 
     def vec_from_word(self, word):
         vec = self.w2v[word]
@@ -496,9 +1459,41 @@ class WMDMatcher(PairwiseMatcher):
         if len(valid_tokens) == 0:
             return None
         vecs = [self.vec_from_word(t) for t in valid_tokens]
-        weights = []
+        counts = Counter(valid_tokens)
+        weights = np.array([counts[t] / len(valid_tokens) for t in dict.fromkeys(valid_tokens)], dtype=np.double)
         return WMDDocument(text, valid_tokens, vecs, weights)
 
+    def partial_fit(self, texts, labels):
+        n_old = len(self._texts)
+        super(WMDMatcher, self).partial_fit(texts, labels)
+        for doc in self._texts[n_old:]:
+            if doc is None:
+                self._centroids.append(None)
+                self._centroid_errors.append(0.0)
+                continue
+            for token, vec in zip(doc.unique_tokens, doc.unique_vecs):
+                if token not in self._word2id:
+                    self._word2id[token] = len(self._word2id)
+                    self._word_vectors.append(vec)
+            # the vectors of the examples are kept only in the shared storage
+            doc.vecs = doc.unique_vecs = doc.centroid = None
+            # the exact scores use the stored word vectors, so the centroid is computed from them as well
+            centroid = np.dot(doc.weights, self._unique_vecs(doc))
+            self._centroids.append(centroid)
+            stored = self._centroids.take([len(self._centroids) - 1])[0]
+            self._centroid_errors.append(float(np.sqrt(np.sum((stored - centroid) ** 2))))
+        self._bounds_data = None
+        return self
+
+    def reset(self):
+        self._word2id = {}
+        self._word_vectors = VectorStorage(dtype=self.dtype)
+        self._centroids = VectorStorage(dtype=self._word_vectors.compute_dtype)
+        self._centroid_errors = []
+        self._distance_cache = WordDistanceCache(self._word_vectors, max_size=self.distance_cache_size)
+        self._bounds_data = None
+        return super(WMDMatcher, self).reset()
+
     @staticmethod
     def text2bow(tokens, word2idx):
         bow = np.zeros(len(word2idx), dtype=np.double)
@@ -507,24 +1502,15 @@ class WMDMatcher(PairwiseMatcher):
             bow[word2idx[t]] += 1.0 / n
         return bow
 
-    def compare(self, one, another):
-        if one is None or another is None:
-            return 0
-
+    def _similarity(self, one, another, distances):
+        """ Compute WMD-based similarity, given the distances between the unique tokens of the two documents """
         vocab = sorted(set(one.tokens).union(set(another.tokens)))
         word2idx = {word: i for i, word in enumerate(vocab)}
-        word2vec = {}
-        for w, v in chain(zip(one.tokens, one.vecs), zip(another.tokens, another.vecs)):
-            if w not in word2vec:
-                word2vec[w] = v
-
         distance_matrix = np.zeros((len(vocab), len(vocab)), dtype=np.double)
-        for i, t1 in enumerate(vocab):
-            for j, t2 in enumerate(vocab):
-                if t1 not in one.tokens or t2 not in another.tokens:
-                    continue
-                # Compute Euclidean distance between word vectors.
-                distance_matrix[i, j] = np.sqrt(np.sum((word2vec[t1] - word2vec[t2]) ** 2))
+        distance_matrix[np.ix_(
+            [word2idx[t] for t in one.unique_tokens],
+            [word2idx[t] for t in another.unique_tokens],
+        )] = distances
 
         d1 = self.text2bow(one.tokens, word2idx)
         d2 = self.text2bow(another.tokens, word2idx)
@@ -534,9 +1520,132 @@ class WMDMatcher(PairwiseMatcher):
         similarity = 1 - wmd ** 2 / 2
         return similarity
 
+    def _unique_vecs(self, doc):
+        """ Return the vectors of the unique tokens of the document, restoring them from the storage for examples """
+        if doc.unique_vecs is not None:
+            return doc.unique_vecs
+        return self._word_vectors.take([self._word2id[t] for t in doc.unique_tokens]).astype(np.double)
 
-def make_matcher_with_regex(base_matcher: BaseMatcher, intents, merge=True, re_matcher: RegexMatcher = None):
-    """ Create a mix of the given matcher and a regex matcher """
+    def compare(self, one, another):
+        if one is None or another is None:
+            return 0
+        # Compute Euclidean distances between word vectors.
+        differences = self._unique_vecs(one)[:, np.newaxis, :] - self._unique_vecs(another)[np.newaxis, :, :]
+        return self._similarity(one, another, np.sqrt(np.sum(differences ** 2, axis=-1)))
+
+    def _get_bounds_data(self):
+        """ Concatenate the word ids and weights of all valid examples, to compute the lower bounds at once """
+        if self._bounds_data is None:
+            doc_ids = [i for i, doc in enumerate(self._texts) if doc is not None]
+            docs = [self._texts[i] for i in doc_ids]
+            lengths = [len(doc.unique_tokens) for doc in docs]
+            self._bounds_data = dict(
+                doc_ids=np.array(doc_ids, dtype=int),
+                word_ids=np.array([self._word2id[t] for doc in docs for t in doc.unique_tokens], dtype=int),
+                weights=np.concatenate([doc.weights for doc in docs]) if docs else np.zeros(0),
+                offsets=np.cumsum([0] + lengths[:-1]).astype(int),
+            )
+        return self._bounds_data
+
+    def _upper_bounds(self, query, rows):
+        """ Return the upper bounds of similarity between the query and each example
+        (based on the lower bounds of WMD), or 0 for the examples that have no known words.
+        """
+        result = np.zeros(len(self._texts), dtype=np.double)
+        data = self._get_bounds_data()
+        if not len(data['doc_ids']):
+            return result
+        # the EMD moves the mass of identical words for free, even if their stored vectors are rounded
+        own_ids = [(i, self._word2id[t]) for i, t in enumerate(query.unique_tokens) if t in self._word2id]
+        own_distance = 0.0
+        if own_ids:
+            own_ids = tuple(zip(*own_ids))
+            own_distance = float(rows[own_ids].max())
+            rows = rows.copy()
+            rows[own_ids] = 0
+        # the distance between weighted centroids, reduced by the rounding errors of the stored vectors
+        wcd = self._centroids.distances(query.centroid)[data['doc_ids']]
+        wcd -= np.array(self._centroid_errors)[data['doc_ids']] + own_distance
+        # the relaxed WMD: each word of one text goes to the closest word of the other text
+        example_rows = rows[:, data['word_ids']]
+        rwmd_query = np.dot(query.weights, np.minimum.reduceat(example_rows, data['offsets'], axis=1))
+        rwmd_example = np.add.reduceat(data['weights'] * example_rows.min(axis=0), data['offsets'])
+        lower_bounds = np.maximum(wcd, np.maximum(rwmd_query, rwmd_example))
+        result[data['doc_ids']] = 1 - lower_bounds ** 2 / 2 + 1e-9
+        return result
+
+    def _query_distances(self, query):
+        """ Return the distances from the words of the preprocessed query to all the fitted words """
+        return np.array([
+            self._distance_cache.get(token, vec) for token, vec in zip(query.unique_tokens, query.unique_vecs)
+        ])
+
+    def _prepare_query(self, text):
+        """ Return the preprocessed query, the distances from its words to the fitted words, and the upper bounds """
+        query = self.preprocess(text)
+        if query is None:
+            return None, None, None
+        rows = self._query_distances(query)
+        return query, rows, self._upper_bounds(query, rows)
+
+    def _exact_score(self, query, rows, doc_id):
+        doc = self._texts[doc_id]
+        if doc is None:
+            return 0
+        return self._similarity(query, doc, rows[:, [self._word2id[t] for t in doc.unique_tokens]])
+
+    def get_scores(self, text):
+        query = self.preprocess(text)
+        if query is None:
+            return [0] * len(self._texts), self._labels
+        rows = self._query_distances(query)
+        return [self._exact_score(query, rows, doc_id) for doc_id in range(len(self._texts))], self._labels
+
+    def match(self, text: str, use_threshold=True):
+        query, rows, upper_bounds = self._prepare_query(text)
+        if query is None:
+            return super(WMDMatcher, self).match(text, use_threshold=use_threshold)
+        best_score = -math.inf
+        best_id = None
+        for doc_id in np.argsort(-upper_bounds, kind='stable'):
+            if upper_bounds[doc_id] < best_score:
+                break
+            if upper_bounds[doc_id] == best_score and doc_id > best_id:
+                continue
+            threshold = self.get_threshold(self._labels[doc_id]) if use_threshold else -math.inf
+            if upper_bounds[doc_id] < threshold:
+                continue
+            score = self._exact_score(query, rows, doc_id)
+            if score < threshold:
+                continue
+            # among the equal scores, the first example wins, as in the exhaustive search
+            if score > best_score or (score == best_score and doc_id < best_id):
+                best_score = score
+                best_id = doc_id
+        if best_id is None:
+            return None, -math.inf
+        return self._labels[best_id], best_score
+
+    def get_scores_above(self, text, threshold):
+        query, rows, upper_bounds = self._prepare_query(text)
+        if query is None:
+            return self.get_scores(text)
+        candidates = np.nonzero(upper_bounds >= threshold)[0]
+        scores = [self._exact_score(query, rows, doc_id) for doc_id in candidates]
+        return scores, [self._labels[doc_id] for doc_id in candidates]
+
+
+def make_matcher_with_regex(
+        base_matcher: BaseMatcher, intents, merge=True, re_matcher: RegexMatcher = None, snapshot_path=None,
+        confidence=None, n_jobs=None,
+):
+    """ Create a mix of the given matcher and a regex matcher.
+    If `snapshot_path` is given, the fitted matchers are restored from it (if it was made from the same intents),
+    or saved to it after fitting.
+    If `confidence` is given, the base matcher is run only if the regex matcher has no matches with this score.
+    If `n_jobs` is given, the pairwise matchers within the base matcher preprocess the examples in this number
+    of processes (unless their own `n_jobs` is set).
+    """
     labels = []
     texts = []
     re_labels = []
@@ -553,11 +1662,24 @@ def make_matcher_with_regex(base_matcher: BaseMatcher, intents, merge=True, re_m
             for ex in intent['examples']:
                 labels.append(intent_name)
                 texts.append(ex)
-    base_matcher.fit(texts, labels)
     if re_matcher is None:
         re_matcher = RegexMatcher(merge=merge)
+    if confidence is None:
+        result = MaxMatcher([base_matcher, re_matcher])
+    else:
+        result = TieredMatcher([re_matcher, base_matcher], confidence=confidence)
+    source_hash = snapshots.source_hash(texts, labels, re_texts, re_labels)
+    if snapshot_path and result.load(snapshot_path, source_hash=source_hash):
+        return result
+    if n_jobs is not None:
+        for m in base_matcher._iter_matchers():
+            if isinstance(m, PairwiseMatcher) and m.n_jobs is None:
+                m.n_jobs = n_jobs
+    base_matcher.fit(texts, labels)
     re_matcher.fit(re_texts, re_labels)
-    return MaxMatcher([base_matcher, re_matcher])
+    if snapshot_path:
+        result.save(snapshot_path, source_hash=source_hash)
+    return result
 
 
 _matchers = dict()
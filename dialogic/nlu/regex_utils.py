@@ -1,5 +1,7 @@
 import re
-from typing import Dict
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
 
 try:
     import regex
@@ -13,16 +15,214 @@ def drop_none(d):
     return {k: v for k, v in d.items() if v is not None}
 
 
+class IntentRegexEngine:
+    """ Matches a text with the regular expressions of many intents in a single pass,
+    producing both the intent scores (1 or 0) and the forms (named groups) of the matched expressions.
+
+    The scores are computed with the expressions wrapped between `^` and `$` (if `add_end` is True),
+    and merged into one expression per intent (if `merge` is True).
+    The forms are extracted from the first expression of each intent that matches the text prefix,
+    using the `regex` module (if it is installed), like `match_forms`.
+    To find it, all the expressions of each intent are merged into one alternation with renamed groups,
+    so each intent is checked by a single prefix match. If the scores are computed by the same module,
+    a failed prefix match means that the full match is impossible as well, so the expressions used for the scores
+    are run only for the intents whose prefix match succeeded. Otherwise, the scores and the forms are computed
+    separately (and the forms only if they are requested), because the modules may parse some expressions differently.
+    Besides, all the expressions are merged into a single alternation, used as a prefilter for the scores:
+    if it does not match the text, no expression can match it, so all the other checks are skipped.
+    The result for the last matched text is memoized.
+    """
+    def __init__(self, add_end=True, merge=True, re_module=None):
+        self.add_end = add_end
+        self.merge = merge
+        self.re = re_module or re
+        self.labels = []
+        self.expressions = []
+        # for each label: its expressions, and their compiled forms expressions and merged alternation
+        # (which are created on the first use, because the `regex` module may fail to compile some expressions)
+        self._label_texts: Dict[str, List[str]] = {}
+        self._forms_expressions: Dict[str, Tuple[List, Optional[Tuple]]] = {}
+        self._raw_texts: List[str] = []
+        self._prefilter = None
+        self._last: Optional[Tuple[str, List[float], Dict[str, Dict]]] = None
+
+    def _wrap(self, text):
+        if self.add_end:
+            return '^{}$'.format(text)
+        return text
+
+    def add(self, texts, labels):
+        parts = OrderedDict()
+        for text, label in zip(texts, labels):
+            parts.setdefault(label, []).append(text)
+        for label, expressions in parts.items():
+            if self.merge:
+                groups = [expressions]
+            else:
+                groups = [[e] for e in expressions]
+            for group in groups:
+                self.expressions.append(
+                    self.re.compile('(?:{})'.format('|'.join([self._wrap(e) for e in group])))
+                )
+                self.labels.append(label)
+            self._label_texts.setdefault(label, []).extend(expressions)
+            self._forms_expressions.pop(label, None)
+            self._raw_texts.extend(expressions)
+        self._prefilter = self._make_prefilter(self._raw_texts)
+        self._last = None
+
+    def _make_prefilter(self, expressions):
+        if not expressions:
+            return None
+        # backreferences would be broken by removal of the group names,
+        # and the global inline flags would be applied to all the expressions
+        if any(re.search(r'\(\?P=|\\[1-9]', e) or _GLOBAL_FLAGS.search(e) for e in expressions):
+            return None
+        unnamed = [re.sub(r'\(\?P?<\w+>', '(?:', e) for e in expressions]
+        try:
+            return self.re.compile('(?:{})'.format('|'.join('(?:{})'.format(e) for e in unnamed)))
+        except Exception:
+            # e.g. the expressions have inline flags that cannot be merged
+            return None
+
+    def match(self, text: str, with_forms=True) -> Tuple[List[float], Dict[str, Dict]]:
+        """ Return the list of scores (aligned with self.labels) and the forms of the matched intents.
+        If `with_forms` is False, the forms may be not computed (and returned empty).
+        """
+        last = self._last
+        if last is not None and last[0] == text:
+            if last[2] is None and with_forms:
+                # only the forms are missing
+                self._last = (text, last[1], self._match_all_forms(text))
+                last = self._last
+            return list(last[1]), dict(last[2] or {})
+        scores = [0.0] * len(self.labels)
+        forms = {}
+        passed = self._prefilter is None or self._prefilter.match(text)
+        if self.re is regex_or_re:
+            found = {}
+            for i, (label, expression) in enumerate(zip(self.labels, self.expressions) if passed else []):
+                if label not in found:
+                    found[label] = self._match_forms(label, text)
+                    if found[label] is not None:
+                        forms[label] = found[label]
+                # if no expression of the label matches the text prefix, the full match is impossible too
+                if found[label] is not None:
+                    scores[i] = float(bool(expression.match(text)))
+        else:
+            if passed:
+                scores = [float(bool(expression.match(text))) for expression in self.expressions]
+            forms = self._match_all_forms(text) if with_forms else None
+        self._last = (text, scores, forms)
+        return list(scores), dict(forms or {})
+
+    def _match_all_forms(self, text) -> Dict[str, Dict]:
+        forms = {}
+        for label in self._label_texts:
+            found = self._match_forms(label, text)
+            if found is not None:
+                forms[label] = found
+        return forms
+
+    def _match_forms(self, label, text) -> Optional[Dict[str, str]]:
+        """ Return the forms of the first expression of the label that matches the text prefix, or None """
+        if label not in self._forms_expressions:
+            texts = self._label_texts[label]
+            self._forms_expressions[label] = [regex_or_re.compile(e) for e in texts], _merge_forms_expressions(texts)
+        expressions, merged = self._forms_expressions[label]
+        if merged is None:
+            for exp in expressions:
+                match = exp.match(text)
+                if match:
+                    return drop_none(match.groupdict())
+            return None
+        expression, groups = merged
+        match = expression.match(text)
+        if not match:
+            return None
+        for marker, names in groups:
+            if match.group(marker) is not None:
+                return drop_none({name: match.group(new_name) for new_name, name in names.items()})
+
+    def first_matches(self, text: str, k: int, accept: Optional[Callable] = None) -> List:
+        """ Return at most k distinct labels (accepted by the filter, if it is given) that match the text,
+        in the order of their expressions, stopping after the k-th matched label.
+        """
+        result = []
+        if k <= 0 or (self._prefilter is not None and not self._prefilter.match(text)):
+            return result
+        for label, expression in zip(self.labels, self.expressions):
+            if label in result or (accept is not None and not accept(label)):
+                continue
+            if expression.match(text):
+                result.append(label)
+                if len(result) >= k:
+                    break
+        return result
+
+    def match_batch(self, texts: List[str]) -> List[List[float]]:
+        """ Return the lists of scores (aligned with self.labels) for each text """
+        result = []
+        for text in texts:
+            if self._prefilter is not None and not self._prefilter.match(text):
+                result.append([0.0] * len(self.labels))
+            else:
+                result.append([float(bool(expression.match(text))) for expression in self.expressions])
+        return result
+
+
+_GLOBAL_FLAGS = re.compile(r'\(\?[a-zA-Z]+\)')
+_GROUP_NAME = re.compile(r'(?<!\\)\(\?P?<(\w+)>')
+_GROUP_REFERENCE = re.compile(r'(?<!\\)\(\?P=(\w+)\)')
+
+
+def _merge_forms_expressions(expressions) -> Optional[Tuple]:
+    """ Merge the expressions into one, whose prefix match is that of the first expression matching the text prefix
+    (because the alternatives are tried in their order). The named groups are renamed to keep the expressions apart.
+    Return the merged expression and, for each of the expressions, the name of the group enclosing it
+    and the mapping of the new group names to the original ones.
+    Return None if there is only one expression, or if the expressions cannot be merged.
+    """
+    if len(expressions) < 2:
+        return None
+    # numbered groups and conditions would be broken by the additional groups,
+    # and the global inline flags would be applied to all the expressions
+    if any(re.search(r'\\[1-9]|\\g<|\(\?\(', e) or _GLOBAL_FLAGS.search(e) for e in expressions):
+        return None
+    parts = []
+    groups = []
+    for i, expression in enumerate(expressions):
+        prefix = '_{}_'.format(i)
+        names = {prefix + name: name for name in _GROUP_NAME.findall(expression)}
+        renamed = _GROUP_NAME.sub(lambda m: '(?P<{}{}>'.format(prefix, m.group(1)), expression)
+        renamed = _GROUP_REFERENCE.sub(lambda m: '(?P={}{})'.format(prefix, m.group(1)), renamed)
+        marker = '_{}'.format(i)
+        parts.append('(?P<{}>{})'.format(marker, renamed))
+        groups.append((marker, names))
+    try:
+        return regex_or_re.compile('|'.join(parts)), groups
+    except Exception:
+        # e.g. the expressions have inline flags that cannot be merged
+        return None
+
+
+@lru_cache(maxsize=32)
+def _make_forms_engine(intent_expressions: Tuple[Tuple[str, Tuple[str]]]) -> IntentRegexEngine:
+    # the expressions are not merged, because the same group names may be used in several expressions of an intent
+    engine = IntentRegexEngine(add_end=False, merge=False, re_module=regex_or_re)
+    engine.add(
+        texts=[e for _, expressions in intent_expressions for e in expressions],
+        labels=[name for name, expressions in intent_expressions for _ in expressions],
+    )
+    return engine
+
+
 def match_forms(text: str, intents: dict) -> Dict[str, Dict]:
-    forms = {}
+    intent_expressions = []
     for intent_name, intent_value in intents.items():
         if 'regexp' in intent_value:
             expressions = intent_value['regexp']
             if isinstance(expressions, str):
                 expressions = [expressions]
-            for exp in expressions:
-                match = regex_or_re.match(exp, text)
-                if match:
-                    forms[intent_name] = drop_none(match.groupdict())
-                    break
-    return forms
+            intent_expressions.append((intent_name, tuple(expressions)))
+    return _make_forms_engine(tuple(intent_expressions)).match(text)[1]
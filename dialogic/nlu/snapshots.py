@@ -0,0 +1,156 @@
+"""
+This module saves fitted matchers to disk and restores them, so that a process does not have to refit them on start.
+
+A snapshot is a directory with a pickled object, in which all the numeric numpy arrays are replaced
+by references to separate .npy files. The arrays are loaded as read-only memory maps,
+so the processes that load the same snapshot share its memory, and loading does not depend on the array sizes.
+The snapshot also stores a hash of the data it was built from; if the hash differs, the snapshot is ignored.
+"""
+import hashlib
+import importlib
+import json
+import logging
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import types
+import typing
+
+try:
+    import numpy as np
+    IMPORTED_NUMPY = True
+except ImportError:
+    np = None
+    IMPORTED_NUMPY = False
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 2
+META_FILE = 'meta.json'
+STATE_FILE = 'state.pkl'
+ARRAYS_DIR = 'arrays'
+
+
+def _describe(obj):
+    """ Represent an object that is not JSON-serializable by its type and its repr (e.g. numpy types),
+    or only by its type, if the repr depends on the memory address (e.g. functions).
+    """
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=repr)
+    if IMPORTED_NUMPY and isinstance(obj, (np.ndarray, np.generic)):
+        return {'dtype': str(obj.dtype), 'values': obj.tolist()}
+    description = repr(obj)
+    if re.search(r' at 0x[0-9a-fA-F]+', description):
+        return type(obj).__qualname__
+    return '{}:{}'.format(type(obj).__qualname__, description)
+
+
+def source_hash(*sources) -> str:
+    """ Compute a stable hash of JSON-like data (e.g. intents, texts and labels, matcher configuration).
+    The objects that are not JSON-serializable are represented by their types and reprs,
+    or only by their type names, if the reprs are not stable across processes.
+    """
+    dump = json.dumps(sources, sort_keys=True, ensure_ascii=False, default=_describe)
+    return hashlib.sha256(dump.encode('utf-8')).hexdigest()
+
+
+class _SnapshotPickler(pickle.Pickler):
+    def __init__(self, file, arrays_dir, externals):
+        super(_SnapshotPickler, self).__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.arrays_dir = arrays_dir
+        self.externals = externals
+        self.n_arrays = 0
+
+    def persistent_id(self, obj):
+        if id(obj) in self.externals:
+            return 'external', self.externals[id(obj)]
+        if isinstance(obj, types.ModuleType):
+            return 'module', obj.__name__
+        if IMPORTED_NUMPY and type(obj) in (np.ndarray, np.memmap) and obj.size and not obj.dtype.hasobject:
+            name = '{}.npy'.format(self.n_arrays)
+            self.n_arrays += 1
+            np.save(os.path.join(self.arrays_dir, name), obj, allow_pickle=False)
+            return 'array', name
+        return None
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file, arrays_dir, externals, mmap_mode):
+        super(_SnapshotUnpickler, self).__init__(file)
+        self.arrays_dir = arrays_dir
+        self.externals = externals
+        self.mmap_mode = mmap_mode
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        if kind == 'external':
+            if name not in self.externals:
+                raise pickle.UnpicklingError('The snapshot requires the external object "{}"'.format(name))
+            return self.externals[name]
+        if kind == 'module':
+            return importlib.import_module(name)
+        if kind == 'array':
+            if not IMPORTED_NUMPY:
+                raise ImportError('When loading snapshots with arrays, numpy should be installed')
+            return np.load(os.path.join(self.arrays_dir, name), mmap_mode=self.mmap_mode, allow_pickle=False)
+        raise pickle.UnpicklingError('Unknown persistent id {}'.format(pid))
+
+
+def save_snapshot(obj, path, source_hash: str = None, externals: typing.Dict[str, typing.Any] = None):
+    """ Save the object into the directory `path`, replacing the previous snapshot, if any.
+    The `externals` (name -> object) are not saved; they should be provided again on loading.
+    If several processes save the same snapshot at once, one of them wins, and the others discard their copies.
+    """
+    externals = {id(value): name for name, value in (externals or {}).items()}
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, prefix='.snapshot-')
+    try:
+        os.makedirs(os.path.join(tmp_path, ARRAYS_DIR))
+        with open(os.path.join(tmp_path, STATE_FILE), 'wb') as f:
+            _SnapshotPickler(f, arrays_dir=os.path.join(tmp_path, ARRAYS_DIR), externals=externals).dump(obj)
+        with open(os.path.join(tmp_path, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'format': SNAPSHOT_FORMAT, 'source_hash': source_hash}, f)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    # the previous snapshot is moved away at once, so that it is never seen partially deleted
+    old_path = tmp_path + '-old'
+    try:
+        os.rename(path, old_path)
+    except OSError:
+        # there was no snapshot, or another process has just moved it
+        pass
+    else:
+        shutil.rmtree(old_path, ignore_errors=True)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # another process has saved its snapshot in the meantime
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def load_snapshot(path, source_hash: str = None, externals: typing.Dict[str, typing.Any] = None, mmap_mode='r'):
+    """ Load the object saved by `save_snapshot`.
+    Return None if there is no snapshot, if it was saved with a different format or source hash,
+    or if it cannot be read (e.g. because another process is replacing it right now).
+    """
+    try:
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format') != SNAPSHOT_FORMAT or meta.get('source_hash') != source_hash:
+        return None
+    try:
+        with open(os.path.join(path, STATE_FILE), 'rb') as f:
+            unpickler = _SnapshotUnpickler(
+                f, arrays_dir=os.path.join(path, ARRAYS_DIR), externals=externals or {}, mmap_mode=mmap_mode,
+            )
+            return unpickler.load()
+    except Exception as e:
+        logger.warning('Could not load the snapshot "{}": {}'.format(path, e))
+        return None
@@ -0,0 +1,313 @@
+"""
+This module contains the storage of dense vectors (e.g. text embeddings) used by the embedding-based matchers.
+"""
+import typing
+
+from collections import OrderedDict
+
+try:
+    import numpy as np
+    IMPORTED_NUMPY = True
+except ImportError:
+    np = None
+    IMPORTED_NUMPY = False
+
+
+class VectorStorage:
+    """ Keeps vectors as rows of a single contiguous matrix.
+    The matrix grows with amortized capacity, so adding vectors one by one takes linear time in total.
+    Missing vectors (None) are stored as zero rows.
+
+    To save memory, the vectors may be stored as 'float16', or as 'int8' with a float32 scale for each row
+    (a vector is divided by its maximal absolute value and multiplied by 127).
+    The compact rows are converted to float32 chunk by chunk while computing the products with them,
+    so the full matrix is never decoded at once.
+    """
+    COMPACT_TYPES = {'float16', 'int8'}
+
+    def __init__(self, dtype='float32', capacity=16, chunk_size=4096):
+        if not IMPORTED_NUMPY:
+            raise ImportError('When using VectorStorage, numpy should be installed')
+        self.dtype = np.dtype(dtype)
+        if self.dtype.kind != 'f' and self.dtype != np.int8:
+            raise ValueError('VectorStorage supports only float and int8 types, got {}'.format(self.dtype))
+        self.quantized = self.dtype == np.int8
+        self.initial_capacity = capacity
+        self.chunk_size = chunk_size
+        self._data = None
+        self._scales = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getstate__(self):
+        # the reserved capacity is not saved, so the restored (possibly, read-only) matrix is never written in place
+        state = self.__dict__.copy()
+        if self._data is not None:
+            state['_data'] = self._data[:self._size]
+        if self._scales is not None:
+            state['_scales'] = self._scales[:self._size]
+        return state
+
+    @property
+    def compact(self) -> bool:
+        return self.dtype.name in self.COMPACT_TYPES
+
+    @property
+    def compute_dtype(self):
+        """ The type of the decoded vectors and of the products with them """
+        return np.dtype(np.float32) if self.compact else self.dtype
+
+    @property
+    def dim(self) -> typing.Optional[int]:
+        if self._data is None:
+            return None
+        return self._data.shape[1]
+
+    @property
+    def matrix(self):
+        """ A view of the stored (possibly, compact) vectors as a matrix of shape (len(self), dim) """
+        if self._data is None:
+            return np.zeros((self._size, 0), dtype=self.dtype)
+        return self._data[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        """ The memory taken by the stored vectors """
+        result = self.matrix.nbytes
+        if self._scales is not None:
+            result += self._scales[:self._size].nbytes
+        return result
+
+    def decode(self, start=0, stop=None):
+        """ Return the stored vectors from `start` to `stop` as a float matrix """
+        matrix = self.matrix[start:stop]
+        if self.quantized:
+            return matrix.astype(np.float32) * self._scales[start:stop][:len(matrix), np.newaxis]
+        return matrix.astype(self.compute_dtype, copy=False)
+
+    def take(self, ids):
+        """ Return the stored vectors with the given ids as a float matrix """
+        matrix = self.matrix[ids]
+        if self.quantized:
+            return matrix.astype(np.float32) * self._scales[ids][:, np.newaxis]
+        return matrix.astype(self.compute_dtype, copy=False)
+
+    def distances(self, vector, start=0):
+        """ Return the Euclidean distances from the vector to the stored vectors, beginning from `start` """
+        result = np.empty(max(self._size - start, 0), dtype=np.float64)
+        for chunk_start in range(start, self._size, self.chunk_size):
+            chunk = self.decode(chunk_start, min(chunk_start + self.chunk_size, self._size))
+            result[(chunk_start - start):(chunk_start - start + len(chunk))] = euclidean_distances(vector, chunk)
+        return result
+
+    def _reserve(self, size, dim):
+        if self._data is None:
+            self._data = np.zeros((max(size, self.initial_capacity), dim), dtype=self.dtype)
+            if self.quantized:
+                self._scales = np.zeros(self._data.shape[0], dtype=np.float32)
+        elif size > self._data.shape[0]:
+            new_data = np.zeros((max(size, 2 * self._data.shape[0]), self.dim), dtype=self.dtype)
+            new_data[:self._size] = self._data[:self._size]
+            self._data = new_data
+            if self.quantized:
+                new_scales = np.zeros(new_data.shape[0], dtype=np.float32)
+                new_scales[:self._size] = self._scales[:self._size]
+                self._scales = new_scales
+
+    def extend(self, vectors: typing.Iterable):
+        vectors = list(vectors)
+        dim = self.dim or next((len(v) for v in vectors if v is not None), None)
+        if dim is None:
+            # the dimension is still unknown, so the zero rows will be allocated later
+            self._size += len(vectors)
+            return
+        self._reserve(self._size + len(vectors), dim)
+        for vector in vectors:
+            if vector is None:
+                self._data[self._size] = 0
+            elif self.quantized:
+                vector = np.asarray(vector, dtype=np.float32)
+                scale = float(np.max(np.abs(vector))) / 127 if len(vector) else 0.0
+                self._data[self._size] = np.round(vector / scale) if scale > 0 else 0
+                self._scales[self._size] = scale
+            else:
+                self._data[self._size] = vector
+            self._size += 1
+
+    def append(self, vector):
+        self.extend([vector])
+
+    def dot(self, query):
+        """ Return the dot products of the query vector with all the stored vectors """
+        if self._data is None:
+            return np.zeros(self._size, dtype=self.compute_dtype)
+        if not self.compact:
+            return self.matrix.dot(np.asarray(query, dtype=self.dtype))
+        return self.dot_matrix(np.asarray(query)[np.newaxis, :])[0]
+
+    def dot_matrix(self, queries):
+        """ Return the dot products of each query (rows) with each of the stored vectors (columns) """
+        queries = np.asarray(queries, dtype=self.compute_dtype)
+        if self._data is None:
+            return np.zeros((len(queries), self._size), dtype=self.compute_dtype)
+        if not self.compact:
+            return queries.dot(self.matrix.T)
+        result = np.empty((len(queries), self._size), dtype=self.compute_dtype)
+        for start in range(0, self._size, self.chunk_size):
+            stop = min(start + self.chunk_size, self._size)
+            if self.quantized:
+                # the scales are applied to the products rather than to the decoded rows
+                chunk = self.matrix[start:stop].astype(np.float32)
+                result[:, start:stop] = queries.dot(chunk.T) * self._scales[start:stop]
+            else:
+                result[:, start:stop] = queries.dot(self.matrix[start:stop].T.astype(np.float32))
+        return result
+
+
+def top_k_indices(scores, k: int):
+    """ Return the indices of the k highest scores, sorted by decreasing score """
+    if k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def euclidean_distances(vector, matrix, chunk_size=4096):
+    """ Return the Euclidean distances from the vector to each row of the matrix """
+    result = np.empty(len(matrix), dtype=np.float64)
+    for start in range(0, len(matrix), chunk_size):
+        chunk = matrix[start:start + chunk_size]
+        result[start:start + len(chunk)] = np.sqrt(np.sum((chunk - vector) ** 2, axis=1))
+    return result
+
+
+class WordDistanceCache:
+    """ A bounded LRU cache of distances from words to all the vectors in a VectorStorage.
+    The size of the cache is measured in word pairs. If the storage grows, the cached rows are extended.
+    """
+    def __init__(self, storage: VectorStorage, max_size=1000000):
+        self.storage = storage
+        self.max_size = max_size
+        self._rows = OrderedDict()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        self._rows = OrderedDict()
+        self._size = 0
+
+    def get(self, word, vector):
+        """ Return the distances from the word (with the given vector) to all the stored vectors """
+        row = self._rows.pop(word, None)
+        if row is None:
+            row = np.zeros(0, dtype=np.float64)
+        old_size = len(row)
+        if old_size < len(self.storage):
+            row = np.concatenate([row, self.storage.distances(vector, start=old_size)])
+            self._size += len(row) - old_size
+        self._rows[word] = row
+        while self._size > self.max_size and len(self._rows) > 1:
+            _, evicted = self._rows.popitem(last=False)
+            self._size -= len(evicted)
+        return row
+
+
+class IVFIndex:
+    """ An approximate index for the maximal inner product (e.g. cosine similarity of normalized vectors)
+    with the vectors of a VectorStorage, based on an inverted file with a k-means coarse quantizer.
+
+    The vectors are clustered by spherical k-means into `n_lists` clusters (by default, the square root
+    of the number of vectors), and a query is compared only with the vectors from the `n_probe` clusters
+    whose centroids are the most similar to it. More probes give higher recall, but slower search.
+
+    New vectors of the storage are assigned to the existing clusters by `update`. When the storage grows
+    `retrain_factor` times since the last training, the clusters are trained again.
+    Until the storage has `min_size` vectors, the index is not trained, and `search` returns None (all vectors).
+    """
+    def __init__(
+            self, storage: VectorStorage, n_lists=None, n_probe=8, min_size=1024, retrain_factor=4,
+            n_iter=10, train_size_per_list=32, seed=0,
+    ):
+        self.storage = storage
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_size = min_size
+        self.retrain_factor = retrain_factor
+        self.n_iter = n_iter
+        self.train_size_per_list = train_size_per_list
+        self.seed = seed
+        self.centroids = None
+        self.lists: typing.List[typing.List[int]] = []
+        self._list_arrays = []
+        self._trained_size = 0
+        self._n_indexed = 0
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _assign(self, start, stop):
+        """ Return the ids of the closest centroids for the stored vectors from start to stop """
+        result = np.empty(stop - start, dtype=int)
+        for chunk_start in range(start, stop, self.storage.chunk_size):
+            chunk_stop = min(chunk_start + self.storage.chunk_size, stop)
+            similarities = self.storage.decode(chunk_start, chunk_stop).dot(self.centroids.T)
+            result[(chunk_start - start):(chunk_stop - start)] = np.argmax(similarities, axis=1)
+        return result
+
+    def train(self):
+        size = len(self.storage)
+        n_lists = min(self.n_lists or max(1, int(round(size ** 0.5))), size)
+        rng = np.random.RandomState(self.seed)
+        sample_ids = np.sort(rng.choice(size, min(size, n_lists * self.train_size_per_list), replace=False))
+        sample = self.storage.take(sample_ids)
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(self.n_iter):
+            assignment = np.argmax(sample.dot(centroids.T), axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=n_lists)
+            empty = counts == 0
+            # the empty clusters are restarted from random points of the sample
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+        self.centroids = centroids.astype(np.float32)
+        self.lists = [[] for _ in range(n_lists)]
+        self._list_arrays = [None] * n_lists
+        self._trained_size = size
+        self._n_indexed = 0
+        self._add_range(0, size)
+
+    def _add_range(self, start, stop):
+        for offset, list_id in enumerate(self._assign(start, stop)):
+            self.lists[list_id].append(start + offset)
+            self._list_arrays[list_id] = None
+        self._n_indexed = stop
+
+    def update(self):
+        """ Index the vectors that have been added to the storage since the last update """
+        size = len(self.storage)
+        if size < self.min_size or self.storage.dim is None:
+            return
+        if not self.trained or size >= self._trained_size * self.retrain_factor:
+            self.train()
+        elif size > self._n_indexed:
+            self._add_range(self._n_indexed, size)
+
+    def search(self, query) -> 'typing.Optional[np.ndarray]':
+        """ Return the sorted ids of the candidate vectors for the query, or None if the index is not trained """
+        if not self.trained:
+            return None
+        similarities = self.centroids.dot(np.asarray(query, dtype=np.float32))
+        probes = top_k_indices(similarities, self.n_probe)
+        arrays = []
+        for list_id in probes:
+            if self._list_arrays[list_id] is None:
+                self._list_arrays[list_id] = np.array(self.lists[list_id], dtype=int)
+            arrays.append(self._list_arrays[list_id])
+        return np.sort(np.concatenate(arrays))
@@ -1 +1,15 @@
-from . import flask_ngrok, flask_server
+import importlib
+
+from ..utils.lazy_modules import support_module_getattr
+
+_LAZY_MODULES = {'flask_ngrok', 'flask_server'}
+
+
+def __getattr__(name):
+    # the servers import flask and the SDKs of the messengers, so they are loaded only when they are used
+    if name in _LAZY_MODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+support_module_getattr(__name__)
@@ -7,15 +7,11 @@ from ..dialog.serialized_message import SerializedMessage
 from dialogic.dialog import Context, Response
 from dialogic.dialog.names import SOURCES, REQUEST_TYPES
 from dialogic.storage.database_utils import get_mongo_or_mock, fix_bson_keys
-
-
-try:
-    import pymongo
-except ModuleNotFoundError:
-    pymongo = None
+from dialogic.utils.lazy_modules import lazy_import
 
 
 logger = logging.getLogger(__name__)
+pymongo = lazy_import('pymongo')
 
 
 class BaseMessageLogger:
@@ -86,8 +82,12 @@ class MongoMessageLogger(BaseMessageLogger):
         if self.collection is None:
             if database is None:
                 database = get_mongo_or_mock()
-            if pymongo and not isinstance(write_concern, pymongo.write_concern.WriteConcern):
-                write_concern = pymongo.write_concern.WriteConcern(w=write_concern)
+            try:
+                write_concern_class = pymongo.write_concern.WriteConcern
+            except ModuleNotFoundError:
+                write_concern_class = None
+            if write_concern_class and not isinstance(write_concern, write_concern_class):
+                write_concern = write_concern_class(w=write_concern)
             self.collection = database.get_collection(collection_name, write_concern=write_concern)
 
     def save_a_message(self, message_dict):
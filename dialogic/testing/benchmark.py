@@ -0,0 +1,279 @@
+"""
+This module compares the speed and memory of the matchers on synthetic intent datasets.
+
+Usage example:
+    python -m dialogic.testing.benchmark --scales 100 1000 10000 --output benchmark.json
+
+The results are saved as JSON, so that the runs on different versions of the code can be compared.
+"""
+import argparse
+import datetime
+import gc
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import typing
+
+from dialogic.nlu import matchers
+
+try:
+    import numpy as np
+    IMPORTED_NUMPY = True
+except ImportError:
+    np = None
+    IMPORTED_NUMPY = False
+
+
+WORDS = {
+    'ru': [
+        'привет', 'пока', 'как', 'дела', 'сколько', 'время', 'погода', 'завтра', 'сегодня', 'купить', 'билет',
+        'поезд', 'самолет', 'заказать', 'такси', 'домой', 'работа', 'музыка', 'включи', 'выключи', 'свет',
+        'позвони', 'маме', 'напомни', 'встреча', 'рецепт', 'борщ', 'новости', 'курс', 'доллар', 'рубль', 'игра',
+        'сыграем', 'расскажи', 'анекдот', 'сказку', 'помощь', 'умеешь', 'хочу', 'можно', 'пожалуйста', 'спасибо',
+    ],
+    'en': [
+        'hello', 'bye', 'how', 'are', 'you', 'what', 'time', 'weather', 'tomorrow', 'today', 'buy', 'ticket',
+        'train', 'plane', 'order', 'taxi', 'home', 'work', 'music', 'turn', 'on', 'off', 'light', 'call', 'mom',
+        'remind', 'meeting', 'recipe', 'soup', 'news', 'rate', 'dollar', 'euro', 'game', 'play', 'tell', 'joke',
+        'story', 'help', 'can', 'want', 'please', 'thanks',
+    ],
+}
+SYLLABLES = {
+    'ru': ['ка', 'ло', 'ми', 'ра', 'то', 'се', 'ну', 'да', 'бе', 'ги', 'жу', 'зо', 'пы', 'чи', 'ще', 'ёл'],
+    'en': ['ka', 'lo', 'mi', 'ra', 'to', 'se', 'nu', 'da', 'be', 'gi', 'ju', 'zo', 'py', 'chi', 'sh', 'th'],
+}
+
+
+def make_vocabulary(language='ru', size=2000, seed=0) -> typing.List[str]:
+    """ Return the common words of the language, extended by pseudo-words up to the given size """
+    rng = random.Random(seed)
+    words = list(WORDS[language])
+    known = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choice(SYLLABLES[language]) for _ in range(rng.randint(2, 4)))
+        if word not in known:
+            known.add(word)
+            words.append(word)
+    return words
+
+
+def make_intents(n_examples, n_intents=None, language='ru', seed=0) -> typing.Tuple[typing.List[str], typing.List]:
+    """ Generate texts and labels of a synthetic intent dataset.
+    Each intent has a few key words, and its examples mix them with random filler words.
+    """
+    rng = random.Random(seed)
+    n_intents = n_intents or max(2, int(math.sqrt(n_examples)))
+    vocabulary = make_vocabulary(language=language, size=max(200, n_intents * 4), seed=seed)
+    texts = []
+    labels = []
+    key_words = [rng.sample(vocabulary, 3) for _ in range(n_intents)]
+    for i in range(n_examples):
+        intent = i % n_intents
+        words = rng.sample(key_words[intent], rng.randint(1, 3)) + rng.sample(vocabulary, rng.randint(0, 4))
+        rng.shuffle(words)
+        texts.append(' '.join(words))
+        labels.append('intent_{}'.format(intent))
+    return texts, labels
+
+
+def make_queries(texts, n_queries=200, seed=0) -> typing.List[str]:
+    """ Generate queries as noisy copies of random examples: with dropped words and typos """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n_queries):
+        words = rng.choice(texts).split()
+        if len(words) > 1 and rng.random() < 0.5:
+            words.pop(rng.randrange(len(words)))
+        if words and rng.random() < 0.5:
+            i = rng.randrange(len(words))
+            word = words[i]
+            j = rng.randrange(len(word))
+            words[i] = word[:j] + word[(j + 1):]
+        queries.append(' '.join(words))
+    return queries
+
+
+def make_w2v(texts, dim=50, seed=0) -> dict:
+    """ Generate random word vectors for all the words of the texts """
+    if not IMPORTED_NUMPY:
+        raise ImportError('When using make_w2v, numpy should be installed')
+    rng = np.random.RandomState(seed)
+    words = sorted({word for text in texts for word in text.split()})
+    return {word: rng.normal(size=dim) for word in words}
+
+
+def default_matchers(w2v=None) -> typing.Dict[str, typing.Tuple[typing.Callable, int]]:
+    """ Return a dict: matcher name -> (function that creates the matcher, the maximal number of examples).
+    The slowest matchers are not run on the largest datasets.
+    """
+    result = {
+        'exact': (lambda: matchers.ExactMatcher(), 10 ** 6),
+        'tf-idf': (lambda: matchers.TFIDFMatcher(), 10 ** 6),
+        'levenshtein': (lambda: matchers.TextDistanceMatcher(by_words=False, metric='levenshtein'), 10 ** 3),
+        'edlib': (lambda: matchers.EdlibMatcher(), 10 ** 3),
+        'jaccard': (lambda: matchers.JaccardMatcher(), 10 ** 4),
+        'jaccard-minhash': (lambda: matchers.JaccardMatcher(engine=matchers.MatchingEngine.MINHASH), 10 ** 6),
+        'regex': (lambda: matchers.RegexMatcher(), 10 ** 4),
+        'max(regex, tf-idf)': (
+            lambda: matchers.MaxMatcher([matchers.RegexMatcher(), matchers.TFIDFMatcher()]), 10 ** 4,
+        ),
+        'tiered(exact, tf-idf)': (
+            lambda: matchers.TieredMatcher([matchers.ExactMatcher(), matchers.TFIDFMatcher()]), 10 ** 6,
+        ),
+        'simple_text': (lambda: matchers.make_matcher('simple_text'), 10 ** 2),
+    }
+    if w2v is not None:
+        result['w2v'] = (lambda: matchers.W2VMatcher(w2v=w2v), 10 ** 6)
+        result['w2v-int8'] = (lambda: matchers.W2VMatcher(w2v=w2v, dtype='int8'), 10 ** 6)
+        result['w2v-ivf'] = (lambda: matchers.W2VMatcher(w2v=w2v, engine=matchers.MatchingEngine.IVF), 10 ** 6)
+        result['wmd'] = (lambda: matchers.WMDMatcher(w2v=w2v), 10 ** 4)
+    return result
+
+
+# the packages that should not be imported by `import dialogic`, because they take a lot of time or memory
+HEAVY_MODULES = [
+    'pymorphy2', 'flask', 'telebot', 'pymessenger', 'colorama', 'pyemd', 'requests', 'pymongo', 'numpy', 'scipy',
+]
+
+
+def measure_import_time(module='dialogic', n_runs=5, python=None) -> dict:
+    """ Import the module in fresh interpreters and return the median and minimal import time (in milliseconds),
+    and the list of heavy modules (see HEAVY_MODULES) that were imported with it.
+    """
+    # the time is measured within the interpreter, because `-X importtime` is not available in Python 3.6
+    code = (
+        'import time; start = time.perf_counter(); import {}; elapsed = time.perf_counter() - start; '
+        'import json, sys; print(json.dumps([elapsed, sorted(sys.modules)]))'
+    ).format(module)
+    times = []
+    loaded = []
+    for _ in range(n_runs):
+        process = subprocess.run(
+            [python or sys.executable, '-c', code],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True,
+        )
+        elapsed, modules = json.loads(process.stdout.splitlines()[-1])
+        times.append(elapsed * 1000)
+        loaded = [name for name in modules if name in HEAVY_MODULES]
+    return {
+        'module': module,
+        'import_ms_median': _percentile(times, 50),
+        'import_ms_min': min(times) if times else None,
+        'heavy_modules': loaded,
+    }
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def benchmark_matcher(make_matcher: typing.Callable, texts, labels, queries, batch_size=64) -> dict:
+    """ Measure fit time, peak memory during fit, memory retained by the fitted matcher,
+    `match` latency (in milliseconds) and `match_batch` throughput (in queries per second).
+    """
+    gc.collect()
+    tracemalloc.start()
+    matcher = make_matcher()
+    matcher.fit(texts, labels)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del matcher
+    gc.collect()
+
+    matcher = make_matcher()
+    start = time.perf_counter()
+    matcher.fit(texts, labels)
+    fit_time = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        matcher.match(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        matcher.match_batch(queries[i:(i + batch_size)])
+    batch_time = time.perf_counter() - start
+
+    return {
+        'fit_seconds': fit_time,
+        'match_ms_p50': _percentile(latencies, 50),
+        'match_ms_p99': _percentile(latencies, 99),
+        'batch_queries_per_second': len(queries) / batch_time if batch_time > 0 else None,
+        'fit_peak_memory_mb': peak / 2 ** 20,
+        'retained_memory_mb': retained / 2 ** 20,
+    }
+
+
+def run_benchmark(
+        scales=(100, 1000, 10000), languages=('ru', 'en'), matcher_names=None, n_queries=200, seed=0,
+        output=None, verbose=False, import_time=True,
+) -> dict:
+    """ Run the benchmark for all the scales (numbers of examples), languages and matchers.
+    Return the report (and save it as JSON, if `output` file name is given).
+    The matchers that cannot be created (e.g. because of missing optional packages) are reported as skipped.
+    If `import_time` is True, the time of `import dialogic` is also measured.
+    """
+    results = []
+    for language in languages:
+        for scale in scales:
+            texts, labels = make_intents(scale, language=language, seed=seed)
+            queries = make_queries(texts, n_queries=n_queries, seed=seed)
+            w2v = make_w2v(texts, seed=seed) if IMPORTED_NUMPY else None
+            for name, (make_matcher, max_examples) in default_matchers(w2v=w2v).items():
+                if matcher_names is not None and name not in matcher_names:
+                    continue
+                result = {'matcher': name, 'language': language, 'n_examples': scale, 'n_queries': len(queries)}
+                if scale > max_examples:
+                    result['skipped'] = 'too many examples'
+                else:
+                    try:
+                        result.update(benchmark_matcher(make_matcher, texts, labels, queries))
+                    except ImportError as e:
+                        result['skipped'] = str(e)
+                if verbose:
+                    print(json.dumps(result, ensure_ascii=False))
+                results.append(result)
+    report = {
+        'created': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if import_time:
+        report['import_time'] = measure_import_time()
+        if verbose:
+            print(json.dumps(report['import_time']))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the speed and memory of the matchers')
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--languages', nargs='+', default=['ru', 'en'], choices=sorted(WORDS))
+    parser.add_argument('--matchers', nargs='+', default=None)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--skip-import-time', action='store_true')
+    args = parser.parse_args()
+    run_benchmark(
+        scales=args.scales, languages=args.languages, matcher_names=args.matchers, n_queries=args.queries,
+        seed=args.seed, output=args.output, verbose=True, import_time=not args.skip_import_time,
+    )
+
+
+if __name__ == '__main__':
+    main()
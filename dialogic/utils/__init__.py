@@ -1 +1 @@
-from . import collections, configuration, content_manager, serialization, database_utils, text
+from . import collections, configuration, content_manager, serialization, database_utils, text, lazy_modules
@@ -1,9 +1,11 @@
 import attr
-import requests
-
 
 from typing import Dict, List, Optional
 
+from .lazy_modules import lazy_import
+
+requests = lazy_import('requests')
+
 
 @attr.s
 class Image:
@@ -0,0 +1,53 @@
+"""
+This module helps to load the heavy packages (e.g. numpy, flask, requests or the SDKs of the messengers)
+only when they are used, because importing them takes a lot of time and memory,
+and a bot usually needs only a few of them.
+
+- `lazy_import` creates a module-level proxy of a package that is imported on the first access to its attributes.
+- `support_module_getattr` makes the module-level `__getattr__` functions (PEP 562) work in Python 3.6 too,
+  so that the heavy submodules and objects can be loaded only when they are accessed.
+"""
+import importlib
+import sys
+import types
+
+
+class LazyImport:
+    """ A proxy of a module that is imported on the first access to its attributes """
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attribute):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        return '<lazily imported module {!r}>'.format(self.__dict__['_name'])
+
+
+def lazy_import(name) -> LazyImport:
+    """ Return a proxy of the module `name`, which is imported on the first access to its attributes.
+    Use it at the module level as `requests = lazy_import('requests')`.
+    """
+    return LazyImport(name)
+
+
+class LazyModule(types.ModuleType):
+    """ A module class that calls the module-level `__getattr__` for the attributes that are not found """
+    def __getattr__(self, name):
+        getter = self.__dict__.get('__getattr__')
+        if getter is None:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(self.__name__, name))
+        return getter(name)
+
+
+def support_module_getattr(module_name):
+    """ Make the `__getattr__` function of the module work in the Python versions that do not support PEP 562.
+    Call it at the end of the module as `support_module_getattr(__name__)`.
+    """
+    if sys.version_info < (3, 7):
+        sys.modules[module_name].__class__ = LazyModule
@@ -1,7 +1,7 @@
 import torch
 from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, AutoModel
 
-from dialogic.nlu.matchers import PairwiseMatcher
+from dialogic.nlu.matchers import EmbeddingMatcher
 
 CHITCHAT_MODEL_NAME = 'cointegrated/rut5-small-chitchat'
 EMBEDDER_MODEL_NAME = 'cointegrated/rubert-tiny2'
@@ -26,22 +26,32 @@ def respond_with_gpt(text: str):
     return chichat_tokenizer.decode(hypotheses[0], skip_special_tokens=True)
 
 
-def encode_with_bert(text: str):
-    t = embedder_tokenizer(text, padding=True, truncation=True, return_tensors='pt')
+def encode_with_bert_batch(texts):
+    t = embedder_tokenizer(texts, padding=True, truncation=True, return_tensors='pt')
     with torch.inference_mode():
         model_output = embedder_model(**{k: v.to(embedder_model.device) for k, v in t.items()})
         embeddings = model_output.last_hidden_state[:, 0, :]
         embeddings = torch.nn.functional.normalize(embeddings)
-    return embeddings[0].cpu().numpy()
+    return list(embeddings.cpu().numpy())
+
+
+def encode_with_bert(text: str):
+    return encode_with_bert_batch([text])[0]
 
 
-class VectorMatcher(PairwiseMatcher):
-    def __init__(self, text_normalization=None, threshold=0.9, **kwargs):
-        super().__init__(text_normalization=text_normalization, threshold=threshold, **kwargs)
+class VectorMatcher(EmbeddingMatcher):
+    # EmbeddingMatcher compares the normalized vectors of all FAQ questions with the query at once
+    def __init__(self, text_normalization=None, threshold=0.9, preprocess_batch_size=64, **kwargs):
+        super().__init__(
+            text_normalization=text_normalization,
+            threshold=threshold,
+            preprocess_batch_size=preprocess_batch_size,
+            **kwargs
+        )
 
     def preprocess(self, text):
         return encode_with_bert(text)
 
-    def compare(self, one, another):
-        # dot product of normalized vectors is cosine distance
-        return sum(one * another)
+    def preprocess_batch(self, texts):
+        # the FAQ questions are embedded in batches, with one forward pass per batch
+        return encode_with_bert_batch(texts)
@@ -40,5 +40,6 @@ setuptools.setup(
         'rumorph': ['pymorphy2[fast]', 'pymorphy2-dicts-ru'],  # todo: move them out of main requirements
         'server': ['flask', 'pymessenger', 'pyTelegramBotAPI'],  # todo: move them out of main requirements
         'w2v':  ['numpy', 'pyemd'],
+        'sparse': ['numpy', 'scipy'],
     }
 )
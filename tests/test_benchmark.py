@@ -0,0 +1,38 @@
+import json
+
+from dialogic.testing import benchmark
+
+
+def test_synthetic_intents():
+    texts, labels = benchmark.make_intents(100, language='en', seed=1)
+    assert len(texts) == len(labels) == 100
+    assert len(set(labels)) == 10
+    assert (texts, labels) == benchmark.make_intents(100, language='en', seed=1)
+    queries = benchmark.make_queries(texts, n_queries=20)
+    assert len(queries) == 20
+
+
+def test_run_benchmark(tmp_path):
+    output = str(tmp_path / 'benchmark.json')
+    report = benchmark.run_benchmark(
+        scales=[50, 200], languages=['ru'], matcher_names=['exact', 'tf-idf', 'simple_text'], n_queries=10,
+        output=output, import_time=False,
+    )
+    with open(output, 'r', encoding='utf-8') as f:
+        assert json.load(f) == report
+    results = {(r['matcher'], r['n_examples']): r for r in report['results']}
+    assert len(results) == 6
+    assert results['simple_text', 200]['skipped']
+    for key in [('exact', 200), ('tf-idf', 200), ('simple_text', 50)]:
+        result = results[key]
+        assert result['fit_seconds'] >= 0
+        assert 0 <= result['match_ms_p50'] <= result['match_ms_p99']
+        assert result['batch_queries_per_second'] > 0
+        assert result['fit_peak_memory_mb'] > 0
+
+
+def test_import_time():
+    # importing the package should not load the heavy optional dependencies
+    result = benchmark.measure_import_time('dialogic', n_runs=1)
+    assert result['heavy_modules'] == []
+    assert result['import_ms_median'] > 0
@@ -1,3 +1,7 @@
+import math
+import random
+import re
+
 import pytest
 from dialogic.cascade import Cascade, DialogTurn
 from dialogic.dialog import Context
@@ -73,3 +77,48 @@ def test_postprocess():
     assert turn.response_text.endswith('tea?')
     # after postprocessing, agenda goes away
     assert not turn.agenda
+
+
+def reference_candidates(cascade, turn):
+    # the original algorithm of selecting the candidates, which checks all the handlers
+    candidates = []
+    for item in cascade.handlers:
+        if item.stages and turn.prev_stage not in item.stages:
+            continue
+        intent_score = -math.inf
+        if item.intents:
+            intent_score = max(turn.intents.get(intent, -math.inf) for intent in item.intents)
+        if intent_score < 1 and item.regexp and turn.text is not None:
+            if re.match(item.regexp, turn.text):
+                intent_score = 1
+        if (item.intents or item.regexp) and intent_score == -math.inf:
+            continue
+        candidates.append((item.priority, intent_score, item))
+    candidates.sort(key=lambda x: x[:2], reverse=True)
+    return [c[2] for c in candidates]
+
+
+def test_dispatch_index():
+    rng = random.Random(42)
+    stages = ['s1', 's2', 's3']
+    intents = ['i{}'.format(i) for i in range(8)]
+    regexps = ['a.*', '.*b', 'ab', '[ac]+']
+    cascade = Cascade()
+    for i in range(300):
+        cascade.add_handler(
+            priority=rng.choice([None, 0.5, 1, 1, 2, 10]),
+            intents=rng.sample(intents, rng.randint(1, 3)) if rng.random() < 0.5 else None,
+            stages=rng.sample(stages, rng.randint(1, 2)) if rng.random() < 0.3 else None,
+            regexp=rng.choice(regexps) if rng.random() < 0.3 else None,
+        )(lambda turn: None)
+    for _ in range(200):
+        stage = rng.choice(stages + [None])
+        text = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 3)))
+        turn_intents = {intent: rng.choice([0.3, 0.5, 1.0]) for intent in rng.sample(intents, rng.randint(0, 4))}
+        ctx = Context(message_text=text, user_object={'stage': stage} if stage else {}, metadata=None)
+        turn = DialogTurn(ctx, text=text, intents=turn_intents)
+        assert cascade.get_index().candidates(turn) == reference_candidates(cascade, turn)
+    index = cascade.get_index()
+    assert cascade.get_index() is index
+    cascade.add_handler()(lambda turn: None)
+    assert cascade.get_index() is not index
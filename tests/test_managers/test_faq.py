@@ -20,8 +20,11 @@ def test_faq():
     r2 = dm.respond(make_context(text='hi there', prev_response=r1))
     assert set(r2.suggests) == {'How are you?', 'What can you do?'}
 
-    r3 = dm.respond(make_context(text='how are you', prev_response=r2))
+    ctx = make_context(text='how are you', prev_response=r2)
+    r3 = dm.respond(ctx)
     assert r3.text == "I'm fine, thanks"
+    # the message is analyzed once per turn, by the context
+    assert ctx._analyzed_text is not None
 
     r4 = dm.respond(make_context(text='What can you do?', prev_response=r3))
     assert r4.text == DEFAULT_MESSAGE
@@ -1,3 +1,5 @@
+import json
+
 from dialogic.cascade import Cascade, DialogTurn
 from dialogic.dialog_manager import TurnDialogManager
 from dialogic.testing.testing_utils import make_context
@@ -18,3 +20,46 @@ def test_turn_dm():
     ctx = make_context('shalom')
     resp = dm.respond(ctx)
     assert resp.text == 'shalom my friend'
+
+
+def test_turn_dm_stats(tmp_path):
+    csc = Cascade()
+
+    @csc.add_handler(priority=0)
+    def fallback(turn: DialogTurn):
+        turn.response_text = 'hi'
+
+    @csc.add_handler(priority=1, intents=['shalom'], checker=lambda turn: turn.text != 'shalom shalom')
+    def greet(turn: DialogTurn):
+        turn.response_text = 'shalom my friend'
+
+    @csc.add_handler(priority=2, intents=['shalom'])
+    def skip(turn: DialogTurn):
+        pass
+
+    dm = TurnDialogManager(cascade=csc, intents_file='tests/test_managers/intents.yaml', instrument=True)
+    assert dm.respond(make_context('shalom')).text == 'shalom my friend'
+    assert dm.respond(make_context('shalom shalom')).text == 'hi'
+    assert dm.respond(make_context('hello')).text == 'hi'
+
+    stats = dm.stats.to_dict()
+    assert stats['handlers']['skip']['candidate'] == 2
+    assert stats['handlers']['skip']['declined'] == 2
+    assert stats['handlers']['greet']['candidate'] == 2
+    assert stats['handlers']['greet']['rejected'] == 1
+    assert stats['handlers']['greet']['won'] == 1
+    assert stats['handlers']['greet']['checker']['calls'] == 2
+    assert stats['handlers']['fallback']['candidate'] == 3
+    assert stats['handlers']['fallback']['won'] == 2
+    assert stats['phases']['total']['calls'] == 3
+    assert stats['phases']['nlu']['seconds'] <= stats['phases']['total']['seconds']
+    assert {name for name, seconds in dm.stats.slowest_handlers()} == {'fallback', 'greet', 'skip'}
+
+    path = str(tmp_path / 'stats.json')
+    dm.stats.dump(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f) == stats
+
+    dm.disable_stats()
+    assert csc.stats is None
+    assert dm.respond(make_context('shalom')).text == 'shalom my friend'
@@ -0,0 +1,82 @@
+import random
+import re
+
+import pytest
+
+from dialogic.nlu import basic_nlu
+
+
+@pytest.mark.parametrize('text,normalized,lemmatized', [
+    ('Привет, Мир!', 'привет мир', 'привет мир'),
+    ('  Ёжики  в тумане ', 'ежики в тумане', 'ежик в туман'),
+    ('Что-то ПОШЛО не так...', 'что то пошло не так', 'что то пойти не так'),
+    ('', '', ''),
+])
+def test_fast_normalize(text, normalized, lemmatized):
+    assert basic_nlu.fast_normalize(text) == normalized
+    assert basic_nlu.fast_normalize(text, lemmatize=True) == lemmatized
+
+
+def test_analyze_is_shared():
+    analyzed = basic_nlu.analyze('Алиса, что ты умеешь?')
+    assert basic_nlu.analyze('Алиса, что ты умеешь?') is analyzed
+    assert basic_nlu.analyze(analyzed) is analyzed
+    assert basic_nlu.analyze(analyzed.normalized) is analyzed
+    assert analyzed.tokens == ['алиса', 'что', 'ты', 'умеешь']
+    assert analyzed.lemmas == ['алиса', 'что', 'ты', 'уметь']
+    assert basic_nlu.like_help(analyzed)
+    assert not basic_nlu.like_yes(analyzed)
+
+
+def test_analysis_cache_disabled():
+    with basic_nlu.analysis_cache_disabled():
+        analyzed = basic_nlu.analyze('Только один раз')
+        assert analyzed.normalized == 'только один раз'
+    assert 'Только один раз' not in basic_nlu._analysis_cache
+    assert basic_nlu.analyze('Только один раз') is not analyzed
+    assert 'Только один раз' in basic_nlu._analysis_cache
+
+
+def test_lemma_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(basic_nlu, 'LEMMA_TABLE', None)
+    monkeypatch.setattr(basic_nlu, '_observed_words', set())
+    basic_nlu.word2lemma.cache_clear()
+    assert basic_nlu.word2lemma('пошло') == 'пойти'
+    path = str(tmp_path / 'lemmas.bin')
+    basic_nlu.save_lemma_table(path, texts=['Ёжики в тумане', 'кошки'])
+
+    basic_nlu.load_lemma_table(path)
+    table = basic_nlu.LEMMA_TABLE
+    assert len(table) == 5
+    assert dict(table.items()) == {'пошло': 'пойти', 'ёжики': 'ёжик', 'в': 'в', 'тумане': 'туман', 'кошки': 'кошка'}
+    assert table.get('собаки') is None
+
+    class NoMorph:
+        def parse(self, word):
+            raise AssertionError('pymorphy2 should not be called for the word "{}"'.format(word))
+
+    monkeypatch.setattr(basic_nlu, 'PYMORPHY', NoMorph())
+    assert [basic_nlu.word2lemma(w) for w in ['тумане', 'кошки', 'пошло']] == ['туман', 'кошка', 'пойти']
+    with pytest.raises(AssertionError):
+        basic_nlu.word2lemma('собаки')
+    basic_nlu.word2lemma.cache_clear()
+
+
+def reference_normalize(text, lemmatize=False):
+    # the original implementation of fast_normalize
+    text = re.sub('[^a-zа-яё0-9]+', ' ', text.lower())
+    text = re.sub('\\s+', ' ', text).strip()
+    if lemmatize:
+        text = ' '.join([basic_nlu.word2lemma(w) for w in text.split()])
+    return re.sub('ё', 'е', text)
+
+
+def test_normalize_batch():
+    rng = random.Random(42)
+    alphabet = 'abcXYZ019абвЁёЕеЯя -_.,!?\t\n«»—😀İßÄ'
+    texts = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30))) for _ in range(300)]
+    texts += ['Привет, Мир!', '  Ёжики  в тумане ', 'Что-то ПОШЛО не так...', 'ёлки-палки, СЁСТРЫ']
+    for lemmatize in [False, True]:
+        expected = [reference_normalize(text, lemmatize=lemmatize) for text in texts]
+        assert basic_nlu.normalize_batch(texts, lemmatize=lemmatize) == expected
+        assert [basic_nlu.fast_normalize(text, lemmatize=lemmatize) for text in texts] == expected
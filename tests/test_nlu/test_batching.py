@@ -0,0 +1,68 @@
+import pickle
+import threading
+
+import pytest
+
+from dialogic.nlu.batching import MicroBatcher
+
+
+def run_concurrently(function, items):
+    results = [None] * len(items)
+    errors = []
+    barrier = threading.Barrier(len(items))
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = function(items[i])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_micro_batcher():
+    batches = []
+
+    def square_all(items):
+        batches.append(list(items))
+        return [x ** 2 for x in items]
+
+    batcher = MicroBatcher(square_all, max_batch_size=4, max_delay=0.2)
+    results, errors = run_concurrently(batcher, list(range(10)))
+    assert not errors
+    assert results == [x ** 2 for x in range(10)]
+    assert sorted(x for batch in batches for x in batch) == list(range(10))
+    assert max(len(batch) for batch in batches) == 4
+    assert len(batches) < 10
+
+    stats = batcher.stats()
+    assert stats['n_items'] == 10
+    assert stats['n_batches'] == len(batches)
+    assert sum(size * count for size, count in stats['batch_sizes'].items()) == 10
+    assert 0 <= stats['queue_delay_ms_p50'] <= stats['queue_delay_ms_p99'] <= stats['queue_delay_ms_max']
+    batcher.close()
+
+    restored = pickle.loads(pickle.dumps(MicroBatcher(len, max_delay=0.01)))
+    assert restored.max_delay == 0.01
+    assert restored.stats()['n_items'] == 0
+
+
+def test_micro_batcher_errors():
+    def fail(items):
+        raise ValueError('failed')
+
+    batcher = MicroBatcher(fail, max_delay=0.01)
+    with pytest.raises(ValueError):
+        batcher(1)
+    batcher.function = lambda items: []
+    with pytest.raises(ValueError):
+        batcher(1)
+    batcher.function = lambda items: [x + 1 for x in items]
+    assert batcher(1) == 2
+    batcher.close()
@@ -1,9 +1,15 @@
 import numpy as np
 import pytest
 import math
+import os
+import random
+import subprocess
+import sys
+import threading
 
 
-from dialogic.nlu import matchers
+from dialogic.nlu import basic_nlu, matchers, snapshots
+from dialogic.nlu.vectors import VectorStorage
 
 sample_texts = ['привет', 'добрый день', 'сколько времени']
 sample_labels = ['hello', 'hello', 'get_time']
@@ -18,6 +24,11 @@ def test_exact_matcher():
     assert matcher.match('приветик') == NO_MATCH
     assert matcher.match('добрый день') == ('hello', 1)
     assert matcher.match('день добрый') == NO_MATCH
+    assert matcher.match('Добрый  день!') == ('hello', 1)
+    assert matcher.aggregate_scores('добрый день', use_threshold=False) == {'hello': 1}
+    assert matcher.get_scores('приветик') == ([], [])
+    matcher.partial_fit(['привет'], ['another_hello'])
+    assert matcher.aggregate_scores('привет') == {'hello': 1, 'another_hello': 1}
 
 
 def test_jaccard_matcher():
@@ -104,20 +115,23 @@ def test_model_matcher():
     assert matcher.match('добрый') == ('hello', 6 / ((6 + 11) / 2))
 
 
+W2V = {
+    k: np.array(v) for k, v in
+    {
+        'привет': [1, 0, 0],
+        'добрый': [0.5, 0.5, 0],
+        'злой': [0.45, 0.55, 0],
+        'день': [0.1, 0.2, 0.7],
+        'ночь': [0.0, 0.4, 0.7],
+        'сколько': [0.0, 0.1, 0.9],
+        'времени': [0.0, 0.5, 0.5],
+    }.items()
+}
+
+
 @pytest.mark.parametrize('matcher_class', [matchers.W2VMatcher, matchers.WMDMatcher])
 def test_vectorized_matcher(matcher_class):
-    w2v = {
-        k: np.array(v) for k, v in
-        {
-            'привет': [1, 0, 0],
-            'добрый': [0.5, 0.5, 0],
-            'злой': [0.45, 0.55, 0],
-            'день': [0.1, 0.2, 0.7],
-            'ночь': [0.0, 0.4, 0.7],
-            'сколько': [0.0, 0.1, 0.9],
-            'времени': [0.0, 0.5, 0.5],
-        }.items()
-    }
+    w2v = W2V
     matcher = matcher_class(w2v=w2v)
     matcher.fit(sample_texts, sample_labels)
     assert matcher.match('времени сколько') == ('get_time', 1)
@@ -127,6 +141,12 @@ def test_vectorized_matcher(matcher_class):
     assert 0.95 < score < 0.99
 
 
+def test_fitting_does_not_fill_analysis_cache():
+    texts = ['пример номер {}'.format(i) for i in range(10)]
+    matchers.JaccardMatcher().fit(texts, list(range(10)))
+    assert not any(text in basic_nlu._analysis_cache for text in texts)
+
+
 def test_scores_aggregation():
     matcher = matchers.JaccardMatcher(threshold=0.1)
     matcher.fit(sample_texts, sample_labels)
@@ -160,6 +180,21 @@ def test_joint_matcher_with_regex():
     assert jm.aggregate_scores('aaaa') == {'a': 1}
 
 
+def test_regex_matcher_with_posix_classes():
+    # the scores are computed by the re module, even if the forms are extracted by regex
+    matcher = matchers.RegexMatcher()
+    matcher.fit(['[[:alpha:]]+'], ['x'])
+    assert matcher.match('[]') == ('x', 1.0)
+
+
+def test_regex_matcher_forms():
+    matcher = matchers.RegexMatcher(merge=False)
+    matcher.fit(['(?P<x>a+)', 'b(?P<y>c)?', '(?P<x>b)'], ['a', 'b', 'b'])
+    assert matcher.get_scores('bc') == ([0.0, 1.0, 0.0], ['a', 'b', 'b'])
+    assert matcher.match_forms('bc') == {'b': {'y': 'c'}}
+    assert matcher.match_forms('aab') == {'a': {'x': 'aa'}}
+
+
 def test_edlib_matcher():
     matcher = matchers.EdlibMatcher()
     matcher.fit(sample_texts, sample_labels)
@@ -181,3 +216,558 @@ def test_edlib_matcher():
     matcher.fit(sample_texts, sample_labels)
     assert matcher.match('сколько времени ыыыыы') == ('get_time', 0.6)
     assert matcher.match('ыыыыы сколько времени') == ('get_time', 0.6)
+
+
+def test_tfidf_inverted_index_is_identical_to_pairwise():
+    texts = ['добрый день', 'доброй ночи', 'добрый вечер', 'доброе утро', 'животное хомяк', 'животное пингвин']
+    labels = ['hello', 'hello', 'hello', 'hello', 'animal', 'animal']
+    matcher_kwargs = dict(text_normalization=matchers.TextNormalization.FAST_LEMMATIZE, ngram=2)
+    pairwise = matchers.TFIDFMatcher(engine=matchers.MatchingEngine.PAIRWISE, **matcher_kwargs).fit(texts, labels)
+    inverted = matchers.TFIDFMatcher(engine=matchers.MatchingEngine.INVERTED, **matcher_kwargs).fit(texts, labels)
+    inverted.partial_fit(['утро доброе'], ['hello'])
+    pairwise.partial_fit(['утро доброе'], ['hello'])
+    for query in ['добрый день', 'добрый хомяк', 'животное собака', 'абракадабра', '']:
+        assert inverted.get_scores(query) == pairwise.get_scores(query)
+
+
+@pytest.mark.parametrize('matcher_class,engine', [
+    (matchers.TFIDFMatcher, matchers.MatchingEngine.INVERTED),
+    (matchers.JaccardMatcher, matchers.MatchingEngine.PAIRWISE),
+])
+def test_sparse_engine(matcher_class, engine):
+    texts = sample_texts + ['добрый вечер', 'который час']
+    labels = sample_labels + ['hello', 'get_time']
+    reference = matcher_class(engine=engine)
+    matcher = matcher_class(engine=matchers.MatchingEngine.SPARSE)
+    assert matcher.get_scores('добрый день') == ([], [])
+    for m in [reference, matcher]:
+        m.fit(texts[:3], labels[:3])
+        m.partial_fit(texts[3:], labels[3:])
+    for query in ['добрый день', 'привет который час', 'абракадабра', '']:
+        scores, labels = matcher.get_scores(query)
+        ref_scores, ref_labels = reference.get_scores(query)
+        assert labels == ref_labels
+        assert scores == pytest.approx(ref_scores)
+
+
+def test_w2v_matcher_storage():
+    matcher = matchers.W2VMatcher(w2v=W2V, threshold=0.1)
+    assert matcher.match('привет') == NO_MATCH
+    matcher.fit(['абракадабра'], ['unknown'])
+    for i in range(20):
+        matcher.partial_fit(sample_texts, sample_labels)
+    assert len(matcher._vectors) == 61
+    assert matcher._vectors.matrix.dtype == np.float32
+    assert matcher.get_scores('абракадабра')[0] == [0.0] * 61
+    assert matcher.match('злой ночь')[0] == 'hello'
+    nearest = matcher.nearest('сколько времени', k=3)
+    assert [label for label, score in nearest] == ['get_time'] * 3
+    assert nearest[0][1] == pytest.approx(1)
+
+
+@pytest.mark.parametrize('dtype', ['float64', 'float16', 'int8'])
+def test_wmd_matcher_pruning(dtype):
+    rng = np.random.RandomState(42)
+    words = ['w{}'.format(i) for i in range(30)]
+    w2v = {w: rng.normal(size=5) for w in words}
+    texts = [' '.join(rng.choice(words, size=rng.randint(1, 5))) for _ in range(60)] + ['unknown']
+    labels = [i % 7 for i in range(len(texts))]
+    matcher = matchers.WMDMatcher(
+        w2v=w2v, threshold=0.3, thresholds={3: 0.5}, distance_cache_size=50, dtype=dtype,
+    )
+    matcher.fit(texts[:30], labels[:30])
+    matcher.partial_fit(texts[30:], labels[30:])
+    for _ in range(20):
+        query = ' '.join(rng.choice(words + ['unknown'], size=rng.randint(1, 5)))
+        scores, labels = matcher.get_scores(query)
+        upper_bounds = matcher._prepare_query(query)[2]
+        if upper_bounds is not None:
+            assert np.all(upper_bounds >= scores)
+        expected = {}
+        for score, label in zip(scores, labels):
+            if score >= matcher.get_threshold(label):
+                expected[label] = max(score, expected.get(label, -math.inf))
+        assert matcher.aggregate_scores(query) == pytest.approx(expected)
+        label, score = matcher.match(query)
+        if expected:
+            assert score == max(expected.values())
+            assert expected[label] == score
+        else:
+            assert (label, score) == NO_MATCH
+        assert matcher.match(query, use_threshold=False)[1] == max(scores)
+    assert len(matcher._distance_cache) <= 50
+    # the fitted examples keep no vectors of their own, but can still be compared
+    query = matcher.preprocess(texts[0])
+    assert matcher.compare(matcher._texts[0], query) == pytest.approx(1)
+    assert matcher.compare(matcher._texts[1], query) == pytest.approx(matcher.get_scores(texts[0])[0][1])
+
+
+@pytest.mark.parametrize('matcher', [
+    matchers.LevenshteinMatcher(threshold=0.7),
+    matchers.TextDistanceMatcher(by_words=True, metric='levenshtein', threshold=0.6),
+    matchers.EdlibMatcher(threshold=0.7),
+    matchers.EdlibMatcher(threshold=0.7, ignore_prefix=False),
+    matchers.EdlibMatcher(threshold=0.7, ignore_suffix=False),
+    matchers.EdlibMatcher(threshold=0.7, ignore_prefix=False, ignore_suffix=False),
+])
+def test_edit_distance_index(matcher):
+    rng = np.random.RandomState(42)
+    words = ['да', 'нет', 'сколько', 'времени', 'время', 'привет', 'добрый', 'день', 'дено', 'а']
+    texts = [' '.join(rng.choice(words, size=rng.randint(1, 4))) for _ in range(100)]
+    matcher.fit(texts, [i % 10 for i in range(len(texts))])
+    for query in texts[:10] + [''] + [' '.join(rng.choice(words, size=rng.randint(1, 5))) for _ in range(30)]:
+        scores, labels = matcher.get_scores(query)
+        expected = {}
+        for score, label in zip(scores, labels):
+            if score >= matcher.threshold:
+                expected[label] = max(score, expected.get(label, -math.inf))
+        assert matcher.aggregate_scores(query) == expected
+
+
+def test_jaccard_minhash_engine():
+    rng = np.random.RandomState(42)
+    words = ['w{}'.format(i) for i in range(100)]
+    texts = [' '.join(rng.choice(words, size=8)) for _ in range(300)]
+    labels = list(range(len(texts)))
+    queries = [' '.join(t.split()[:7]) for t in texts[:50]]
+    matcher = matchers.JaccardMatcher(engine=matchers.MatchingEngine.MINHASH, lsh_bands=32, lsh_rows=2)
+    matcher.fit(texts, labels)
+    assert matcher.match(texts[10]) == (10, 1)
+    assert matcher.match('абракадабра') == NO_MATCH
+    assert len(matcher.get_scores(queries[0])[0]) < len(texts)
+    assert matcher.measure_recall(texts[:50]) == 1
+    assert matcher.measure_recall(queries) > 0.9
+    exact_matcher = matchers.JaccardMatcher().fit(texts, labels)
+    assert exact_matcher.measure_recall(queries) == 1
+
+
+@pytest.mark.parametrize('matcher', [
+    matchers.TFIDFMatcher(threshold=0.3),
+    matchers.TFIDFMatcher(threshold=0.3, engine=matchers.MatchingEngine.SPARSE),
+    matchers.W2VMatcher(w2v=W2V, threshold=0.3),
+    matchers.ModelBasedMatcher(model=PrefixModel(), threshold=0.3),
+    matchers.ExactMatcher(),
+    matchers.JaccardMatcher(threshold=0.3),
+    matchers.MaxMatcher([matchers.ExactMatcher(), matchers.JaccardMatcher()], threshold=0.3),
+])
+def test_batch_matching(matcher):
+    texts = sample_texts + ['добрый вечер', 'который час', 'сколько сейчас времени']
+    labels = sample_labels + ['hello', 'get_time', 'get_time']
+    matcher.fit(texts, labels)
+    queries = ['добрый день', 'привет который час', 'абракадабра', '', 'времени сколько', 'добрый']
+    scores, batch_labels = matcher.get_scores_batch(queries)
+    assert scores.shape == (len(queries), 2)
+    assert set(batch_labels) == {'hello', 'get_time'}
+    for query, row in zip(queries, scores):
+        expected = matcher.aggregate_scores(query, use_threshold=False)
+        assert {label: score for label, score in zip(batch_labels, row) if label in expected} == pytest.approx(expected)
+    for use_threshold in [True, False]:
+        results = matcher.match_batch(queries, use_threshold=use_threshold)
+        for query, (label, score) in zip(queries, results):
+            expected_label, expected_score = matcher.match(query, use_threshold=use_threshold)
+            assert label == expected_label
+            assert score == pytest.approx(expected_score)
+
+
+def test_regex_batch_matching():
+    matcher = matchers.RegexMatcher(add_end=False)
+    matcher.fit(sample_texts + ['.*врем.*'], sample_labels + ['get_time'])
+    scores, labels = matcher.get_scores_batch(['привет мир', 'привет расскажи время', 'пока'])
+    assert labels == ['hello', 'get_time']
+    assert scores.tolist() == [[1, 0], [1, 1], [0, 0]]
+    assert matcher.match_batch(['расскажи время', 'пока']) == [('get_time', 1), (None, -math.inf)]
+
+
+@pytest.mark.parametrize('matcher', [
+    matchers.TFIDFMatcher(threshold=0.2),
+    matchers.W2VMatcher(w2v=W2V, threshold=0.2),
+    matchers.ExactMatcher(),
+    matchers.JaccardMatcher(threshold=0.2, thresholds={'get_time': 0.5}),
+    matchers.MaxMatcher([matchers.ExactMatcher(), matchers.TFIDFMatcher()], threshold=0.2),
+])
+def test_match_top_k(matcher):
+    texts = sample_texts + ['добрый вечер', 'который час', 'сколько сейчас времени', 'пока пока']
+    labels = sample_labels + ['hello', 'get_time', 'get_time', 'bye']
+    matcher.fit(texts, labels)
+    for query in ['добрый день', 'привет который час', 'абракадабра', '', 'времени сколько', 'пока']:
+        for use_threshold in [True, False]:
+            expected = matcher.aggregate_scores(query, use_threshold=use_threshold)
+            for k in [1, 2, 5]:
+                result = matcher.match_top_k(query, k=k, use_threshold=use_threshold)
+                assert len(result) == min(k, len(expected))
+                assert [score for _, score in result] == pytest.approx(sorted(expected.values(), reverse=True)[:k])
+                for label, score in result:
+                    assert expected[label] == pytest.approx(score)
+
+
+def test_regex_match_top_k():
+    matcher = matchers.RegexMatcher(add_end=False, thresholds={'never': 1.5})
+    matcher.fit(['привет.*', '.*врем.*', '.*', '.*'], ['hello', 'get_time', 'never', 'any'])
+    assert matcher.match_top_k('привет время', k=2) == [('hello', 1.0), ('get_time', 1.0)]
+    assert matcher.match_top_k('привет время', k=5) == [('hello', 1.0), ('get_time', 1.0), ('any', 1.0)]
+    assert matcher.match_top_k('время', k=5) == [('get_time', 1.0), ('any', 1.0)]
+
+
+def test_tfidf_pruned_scores():
+    random.seed(1)
+    words = ['слово{}'.format(i) for i in range(100)] + ['и', 'в', 'на'] * 20
+    texts = [' '.join(random.choice(words) for _ in range(5)) for _ in range(300)]
+    labels = ['label{}'.format(i % 30) for i in range(300)]
+    matcher = matchers.TFIDFMatcher(threshold=0.3).fit(texts, labels)
+    for query in texts[:50] + ['и в на слово1', 'слово5 слово6']:
+        full = matcher.aggregate_scores(query, use_threshold=False)
+        expected = {label: score for label, score in full.items() if score >= 0.3}
+        assert matcher.aggregate_scores(query) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('make', [
+    lambda: matchers.TFIDFMatcher(threshold=0.3),
+    lambda: matchers.TFIDFMatcher(threshold=0.3, engine=matchers.MatchingEngine.SPARSE),
+    lambda: matchers.W2VMatcher(w2v=W2V, threshold=0.3),
+    lambda: matchers.ExactMatcher(text_normalization=lambda text: text.lower()),
+    lambda: matchers.LevenshteinMatcher(),
+    lambda: matchers.JaccardMatcher(engine=matchers.MatchingEngine.MINHASH),
+    lambda: matchers.MaxMatcher([matchers.RegexMatcher(add_end=False), matchers.TFIDFMatcher()], threshold=0.3),
+])
+def test_snapshot(make, tmp_path):
+    texts = sample_texts + ['добрый вечер', 'который час', 'сколько сейчас времени']
+    labels = sample_labels + ['hello', 'get_time', 'get_time']
+    queries = ['добрый день', 'привет который час', 'абракадабра', '', 'времени сколько', 'Привет']
+    path = str(tmp_path / 'snapshot')
+
+    matcher = make()
+    matcher.fit(texts, labels)
+    matcher.save(path, source_hash='v1')
+
+    restored = make()
+    assert not restored.load(path, source_hash='v2')
+    assert restored.load(path, source_hash='v1')
+    for query in queries:
+        assert restored.aggregate_scores(query) == pytest.approx(matcher.aggregate_scores(query))
+
+    other_config = make()
+    other_config.threshold = 0.99
+    assert not other_config.load(path, source_hash='v1')
+
+
+def test_snapshot_config_with_numpy_types(tmp_path):
+    assert snapshots.source_hash({'dtype': np.float16}) != snapshots.source_hash({'dtype': np.int8})
+    assert snapshots.source_hash({'dtype': np.dtype('float16')}) != snapshots.source_hash({'dtype': np.dtype('int8')})
+    assert snapshots.source_hash({'stop': {'а', 'и', 'но'}}) == snapshots.source_hash({'stop': {'но', 'и', 'а'}})
+    assert snapshots.source_hash(lambda x: x) == snapshots.source_hash(lambda y: y)
+
+    path = str(tmp_path / 'snapshot')
+    matchers.W2VMatcher(w2v=W2V, dtype=np.float16).fit(sample_texts, sample_labels).save(path)
+    assert not matchers.W2VMatcher(w2v=W2V, dtype=np.int8).load(path)
+    assert matchers.W2VMatcher(w2v=W2V, dtype=np.float16).load(path)
+
+
+def test_snapshot_make_matcher_with_regex(tmp_path):
+    intents = {
+        'hello': {'examples': ['привет', 'здравствуйте'], 'regexp': ['привет.*']},
+        'get_time': {'examples': ['который час', 'сколько времени']},
+    }
+    path = str(tmp_path / 'snapshot')
+    fitted = matchers.make_matcher_with_regex(matchers.TFIDFMatcher(), intents=intents, snapshot_path=path)
+
+    re_matcher = matchers.RegexMatcher()
+    restored = matchers.make_matcher_with_regex(
+        matchers.TFIDFMatcher(), intents=intents, snapshot_path=path, re_matcher=re_matcher,
+    )
+    assert restored.matchers[1] is re_matcher
+    assert re_matcher.match('привет мир') == ('hello', 1)
+    assert isinstance(restored.matchers[0]._texts, list) and len(restored.matchers[0]._texts) == 4
+    assert restored.match('сколько времени') == fitted.match('сколько времени')
+
+
+class NewTFIDFMatcher(matchers.TFIDFMatcher):
+    _snapshot_version = 2
+
+
+def test_snapshot_version_and_damage(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    matchers.TFIDFMatcher().fit(sample_texts, sample_labels).save(path)
+    assert matchers.TFIDFMatcher().load(path)
+    # the snapshots of another version of the fitted state are ignored
+    NewTFIDFMatcher().fit(sample_texts, sample_labels).save(path)
+    assert not matchers.TFIDFMatcher().load(path)
+    assert NewTFIDFMatcher().load(path)
+    with open(os.path.join(path, 'state.pkl'), 'wb') as f:
+        f.write(b'broken')
+    assert not NewTFIDFMatcher().load(path)
+
+
+def test_snapshot_concurrent_save_and_load(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    errors = []
+
+    def work():
+        try:
+            for _ in range(20):
+                matcher = matchers.TFIDFMatcher()
+                if not matcher.load(path):
+                    matcher.fit(sample_texts, sample_labels).save(path)
+                matcher.fit(sample_texts, sample_labels).save(path)
+                assert matcher.match('привет') == ('hello', 1)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert matchers.TFIDFMatcher().load(path)
+    assert sorted(os.listdir(str(tmp_path))) == ['snapshot']
+
+
+class CountingMatcher(matchers.ExactMatcher):
+    _runtime_attributes = ('n_calls',)
+    n_calls = 0
+
+    def get_scores(self, text):
+        self.n_calls += 1
+        return super(CountingMatcher, self).get_scores(text)
+
+
+def test_tiered_matcher(tmp_path):
+    expensive = CountingMatcher(text_normalization=None)
+    matcher = matchers.TieredMatcher([matchers.RegexMatcher(add_end=False), expensive], threshold=0.5)
+    matcher.matchers[0].fit(['привет.*'], ['hello'])
+    expensive.fit(['который час'], ['get_time'])
+    assert matcher.match('привет мир') == ('hello', 1)
+    assert matcher.last_tier == 0
+    assert expensive.n_calls == 0
+    assert matcher.match('который час') == ('get_time', 1)
+    assert matcher.last_tier == 1
+    assert expensive.n_calls == 1
+    assert matcher.match('абракадабра') == (None, -math.inf)
+    assert expensive.n_calls == 2
+    assert matcher.last_tier is None
+    assert matcher.tier_stats == {0: 1, 1: 1}
+    assert 'tier_stats' not in matcher.get_config() and 'last_tier' not in matcher.get_config()
+    # only matching with thresholds is counted
+    matcher.aggregate_scores('привет', use_threshold=False)
+    matcher.get_scores_batch(['привет', 'который час'])
+    assert matcher.tier_stats == {0: 1, 1: 1}
+    assert matcher.match_batch(['привет', 'который час']) == [('hello', 1), ('get_time', 1)]
+    assert matcher.tier_stats == {0: 2, 1: 2}
+    # the counters are not restored from snapshots
+    matcher.save(str(tmp_path / 'snapshot'))
+    restored = matchers.TieredMatcher(
+        [matchers.RegexMatcher(add_end=False), CountingMatcher(text_normalization=None)], threshold=0.5,
+    )
+    assert restored.load(str(tmp_path / 'snapshot'))
+    assert restored.tier_stats == {} and restored.last_tier is None
+    assert restored.match('который час') == ('get_time', 1)
+
+
+@pytest.mark.parametrize('engine', [
+    matchers.MatchingEngine.PAIRWISE, matchers.MatchingEngine.INVERTED, matchers.MatchingEngine.SPARSE,
+])
+def test_tfidf_incremental_fit(engine):
+    texts = sample_texts + ['добрый вечер', 'который час', 'сколько сейчас времени', 'добрый добрый день']
+    labels = sample_labels + ['hello', 'get_time', 'get_time', 'hello']
+    full = matchers.TFIDFMatcher(engine=engine, threshold=0.2).fit(texts, labels)
+    incremental = matchers.TFIDFMatcher(engine=engine, threshold=0.2).fit(texts[:2], labels[:2])
+    incremental.match('добрый день')
+    for text, label in zip(texts[2:], labels[2:]):
+        incremental.partial_fit([text], [label])
+    assert incremental.vocab == full.vocab
+    for query in ['добрый день', 'который час', 'сколько времени', 'добрый', 'абракадабра']:
+        assert incremental.get_scores(query)[0] == pytest.approx(full.get_scores(query)[0])
+        assert incremental.aggregate_scores(query) == pytest.approx(full.aggregate_scores(query))
+    batch, batch_labels = incremental.get_scores_batch(['добрый день'])
+    assert dict(zip(batch_labels, batch[0])) == pytest.approx(full.aggregate_scores('добрый день', use_threshold=False))
+
+
+@pytest.mark.parametrize('dtype,tolerance', [('float64', 1e-12), ('float16', 1e-3), ('int8', 2e-2)])
+def test_compact_vector_storage(dtype, tolerance):
+    rng = np.random.RandomState(42)
+    vectors = rng.normal(size=(50, 8))
+    storage = VectorStorage(dtype=dtype, capacity=4, chunk_size=7)
+    storage.extend(vectors[:10])
+    storage.append(None)
+    storage.extend(vectors[10:])
+    assert len(storage) == 51
+    expected = np.concatenate([vectors[:10], np.zeros((1, 8)), vectors[10:]])
+    assert np.abs(storage.decode() - expected).max() < tolerance * 5
+    queries = rng.normal(size=(3, 8))
+    assert np.abs(storage.dot_matrix(queries) - queries.dot(expected.T)).max() < tolerance * 10
+    assert np.abs(storage.dot(queries[0]) - expected.dot(queries[0])).max() < tolerance * 10
+    assert np.abs(storage.distances(queries[0], start=5) - np.sqrt(((expected[5:] - queries[0]) ** 2).sum(1))).max() \
+        < tolerance * 10
+
+
+@pytest.mark.parametrize('dtype', ['float16', 'int8'])
+def test_compact_embedding_matchers(dtype):
+    rng = np.random.RandomState(42)
+    words = ['w{}'.format(i) for i in range(30)]
+    w2v = {w: rng.normal(size=5) for w in words}
+    texts = [' '.join(rng.choice(words, size=rng.randint(1, 5))) for _ in range(30)]
+    labels = [i % 7 for i in range(len(texts))]
+    queries = [' '.join(rng.choice(words, size=rng.randint(1, 5))) for _ in range(8)]
+    for matcher_class in [matchers.W2VMatcher, matchers.WMDMatcher]:
+        reference = matcher_class(w2v=w2v, dtype='float64').fit(texts, labels)
+        compact = matcher_class(w2v=w2v, dtype=dtype).fit(texts, labels)
+        for query in queries:
+            expected = [reference.compare(reference.preprocess(query), reference.preprocess(text)) for text in texts]
+            assert reference.get_scores(query)[0] == pytest.approx(expected)
+            assert compact.get_scores(query)[0] == pytest.approx(expected, abs=0.02)
+
+
+class RandomVectorMatcher(matchers.EmbeddingMatcher):
+    def __init__(self, vectors, **kwargs):
+        super(RandomVectorMatcher, self).__init__(text_normalization=None, **kwargs)
+        self.vectors = vectors
+
+    def preprocess(self, text):
+        return self.vectors.get(text)
+
+
+def test_embedding_matcher_ivf():
+    rng = np.random.RandomState(42)
+    centers = rng.normal(size=(20, 16))
+    points = centers[rng.randint(0, 20, size=600)] + 0.3 * rng.normal(size=(600, 16))
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    vectors = {str(i): vector for i, vector in enumerate(points)}
+    texts = [str(i) for i in range(500)]
+    labels = [i % 50 for i in range(500)]
+    queries = [str(i) for i in range(500, 600)]
+
+    exact = RandomVectorMatcher(vectors, threshold=0.5).fit(texts, labels)
+    matcher = RandomVectorMatcher(vectors, threshold=0.5, engine='ivf', n_probe=3, ivf_min_size=100)
+    matcher.fit(texts[:50], labels[:50])
+    assert not matcher._index.trained
+    matcher.partial_fit(texts[50:200], labels[50:200])
+    assert matcher._index.trained
+    matcher.partial_fit(texts[200:], labels[200:])
+    assert sum(len(ids) for ids in matcher._index.lists) == 500
+    assert matcher.measure_recall(queries) > 0.9
+    assert exact.measure_recall(queries) == 1
+    for query in queries[:10]:
+        scores, found_labels = matcher.get_scores(query)
+        assert len(scores) < 500
+        assert matcher.nearest(query, k=1)[0][1] == pytest.approx(max(scores))
+    # the batches are scored exactly
+    for (label, score), (exact_label, exact_score) in zip(matcher.match_batch(queries), exact.match_batch(queries)):
+        assert label == exact_label
+        assert score == pytest.approx(exact_score)
+    batch_scores, batch_labels = matcher.get_scores_batch(queries[:10])
+    exact_scores, exact_labels = exact.get_scores_batch(queries[:10])
+    assert batch_labels == exact_labels
+    assert batch_scores == pytest.approx(exact_scores)
+
+
+NO_NUMPY_SCRIPT = """
+import sys
+for name in ['numpy', 'scipy']:
+    sys.modules[name] = None
+from dialogic.nlu import matchers
+texts, labels = ['привет', 'добрый день', 'сколько времени'], ['hello', 'hello', 'get_time']
+for matcher in [
+    matchers.TFIDFMatcher(), matchers.JaccardMatcher(), matchers.ExactMatcher(),
+    matchers.make_matcher_with_regex(matchers.TFIDFMatcher(), intents={'hello': {'regexp': 'привет.*'}}),
+]:
+    matcher.fit(texts, labels)
+    assert matcher.match('привет')[0] == 'hello', matcher
+    assert matcher.match('добрый день')[0] == 'hello', matcher
+print('ok')
+"""
+
+
+def test_matchers_without_numpy():
+    # numpy is an optional dependency, so the matchers that do not need it should work without it
+    process = subprocess.run(
+        [sys.executable, '-c', NO_NUMPY_SCRIPT],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+    assert process.returncode == 0, process.stderr
+    assert process.stdout.strip() == 'ok'
+
+
+class BatchVectorMatcher(RandomVectorMatcher):
+    _state_attributes = ('batch_sizes',)
+
+    def __init__(self, vectors, **kwargs):
+        super(BatchVectorMatcher, self).__init__(vectors, **kwargs)
+        self.batch_sizes = []
+
+    def preprocess(self, text):
+        raise AssertionError('The texts should be preprocessed in batches')
+
+    def preprocess_batch(self, texts):
+        self.batch_sizes.append(len(texts))
+        return [self.vectors.get(text) for text in texts]
+
+
+def test_preprocess_batch():
+    rng = np.random.RandomState(42)
+    points = rng.normal(size=(10, 8))
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    vectors = {str(i): vector for i, vector in enumerate(points)}
+    texts = [str(i) for i in range(7)]
+    matcher = BatchVectorMatcher(vectors, preprocess_batch_size=3).fit(texts, texts)
+    assert matcher.batch_sizes == [3, 3, 1]
+    matcher.partial_fit(['7', '8'], ['7', '8'])
+    assert matcher.batch_sizes == [3, 3, 1, 2]
+    assert [label for label, score in matcher.match_batch(['2', '8', '9'])] == ['2', '8', None]
+    assert matcher.batch_sizes[-1] == 3
+
+    exact = matchers.ExactMatcher(preprocess_batch_size=2).fit(['Привет!', 'пока'], ['hello', 'bye'])
+    assert exact.match('привет') == ('hello', 1)
+
+
+def test_micro_batching(tmp_path):
+    rng = np.random.RandomState(42)
+    points = rng.normal(size=(16, 8))
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    vectors = {str(i): vector for i, vector in enumerate(points)}
+    texts = [str(i) for i in range(16)]
+    matcher = BatchVectorMatcher(vectors, micro_batch_delay=0.2, micro_batch_size=8).fit(texts, texts)
+    matcher.batch_sizes = []
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def worker(text):
+        barrier.wait()
+        results[text] = matcher.match(text)
+
+    threads = [threading.Thread(target=worker, args=(text,)) for text in texts[:8]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert {text: label for text, (label, score) in results.items()} == {text: text for text in texts[:8]}
+    assert sum(matcher.batch_sizes) == 8
+    assert len(matcher.batch_sizes) < 8
+    assert matcher.micro_batch_stats()['n_items'] == 8
+
+    matcher.save(str(tmp_path / 'snapshot'))
+    restored = BatchVectorMatcher(vectors, micro_batch_delay=0.2, micro_batch_size=8)
+    assert restored.load(str(tmp_path / 'snapshot'))
+    assert restored.micro_batch_stats() is None
+    assert restored.match('3')[0] == '3'
+    assert restored.micro_batch_stats()['n_items'] == 1
+
+
+def test_parallel_fit(tmp_path):
+    texts = ['привет {}'.format(i) for i in range(20)] + ['сколько времени {}'.format(i) for i in range(20)]
+    labels = ['hello'] * 20 + ['get_time'] * 20
+    sequential = matchers.TFIDFMatcher(text_normalization='fast_lemmatize').fit(texts, labels)
+    parallel = matchers.TFIDFMatcher(text_normalization='fast_lemmatize', n_jobs=2, preprocess_batch_size=7)
+    parallel.fit(texts, labels)
+    assert parallel._texts == sequential._texts
+    assert list(parallel.vocab.items()) == list(sequential.vocab.items())
+    assert parallel.match('привет 3') == sequential.match('привет 3')
+
+    jaccard = matchers.JaccardMatcher(n_jobs=2, preprocess_batch_size=7).fit(texts, labels)
+    assert jaccard._texts == matchers.JaccardMatcher().fit(texts, labels)._texts
+
+    # the number of processes does not affect the snapshots
+    parallel.save(str(tmp_path / 'snapshot'))
+    restored = matchers.TFIDFMatcher(text_normalization='fast_lemmatize')
+    assert restored.load(str(tmp_path / 'snapshot'))
+    assert restored.n_jobs is None
+    assert restored._texts == sequential._texts
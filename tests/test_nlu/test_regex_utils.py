@@ -0,0 +1,81 @@
+import random
+import re
+
+from dialogic.nlu.regex_utils import IntentRegexEngine, match_forms, regex
+
+intents = {
+    'choose': {'regexp': ['(choose|take) (?P<id>[0-9]+)', '(?P<id>[0-9]+)']},
+    'greet': {'regexp': 'hello( (?P<name>[a-z]+))?', 'examples': ['hi']},
+    'examples_only': {'examples': ['yes']},
+    'count': {'regexp': '(?P<id>[0-9]+) (?P=id)'},
+}
+
+
+def test_match_forms():
+    assert match_forms('take 10', intents) == {'choose': {'id': '10'}}
+    assert match_forms('10', intents) == {'choose': {'id': '10'}}
+    assert match_forms('hello', intents) == {'greet': {}}
+    assert match_forms('hello world and goodbye', intents) == {'greet': {'name': 'world'}}
+    assert match_forms('5 5', intents) == {'choose': {'id': '5'}, 'count': {'id': '5'}}
+    assert match_forms('goodbye', intents) == {}
+
+
+def test_intent_regex_engine():
+    engine = IntentRegexEngine()
+    engine.add(['hello( (?P<name>[a-z]+))?', 'hi'], ['greet', 'greet'])
+    engine.add(['(?P<id>[0-9]+)'], ['choose'])
+    assert engine._prefilter is not None
+    assert engine.labels == ['greet', 'choose']
+    assert engine.match('hello world') == ([1.0, 0.0], {'greet': {'name': 'world'}})
+    # the forms are matched by prefix, but the scores require the full match
+    assert engine.match('10 and more') == ([0.0, 0.0], {'choose': {'id': '10'}})
+    assert engine.match('what?') == ([0.0, 0.0], {})
+    scores, forms = engine.match('hi')
+    forms['choose'] = {}
+    assert engine.match('hi') == ([1.0, 0.0], {'greet': {}})
+
+
+def test_intent_regex_engine_is_identical_to_separate_matching():
+    expressions = {
+        'choose': ['(choose|take) (?P<id>[0-9]+)', '(?P<id>[0-9]+)', 'number (?P<id>[0-9]+)?'],
+        'greet': ['hello( (?P<name>[a-z]+))?', 'hi', 'good (?P<part>morning|evening)'],
+        'count': ['(?P<id>[0-9]+) (?P=id)', '(?P<id>[0-9]+) (?P<id2>[0-9]+)'],
+        'anything': ['.*'],
+    }
+    texts = [e for exps in expressions.values() for e in exps]
+    labels = [label for label, exps in expressions.items() for _ in exps]
+    words = ['choose', 'take', 'number', 'hello', 'hi', 'good', 'morning', 'world', '5', '10', '']
+    random.seed(42)
+    queries = [' '.join(random.choice(words) for _ in range(random.randint(0, 4))) for _ in range(300)]
+    # the expressions of an intent with the same group names can be merged for the scores only by the regex module
+    options = [(add_end, False) for add_end in [True, False]]
+    if regex is not None:
+        options += [(add_end, True) for add_end in [True, False]]
+    for add_end, merge in options:
+        engine = IntentRegexEngine(add_end=add_end, merge=merge, re_module=regex if merge else re)
+        engine.add(texts[:5], labels[:5])
+        engine.add(texts[5:], labels[5:])
+        for query in queries:
+            scores, forms = engine.match(query)
+            assert forms == match_forms(query, {label: {'regexp': exps} for label, exps in expressions.items()})
+            # the scores are the same as if all the expressions were checked
+            assert scores == [float(bool(expression.match(query))) for expression in engine.expressions]
+        assert all(engine._forms_expressions[label][1] is not None for label in expressions if label != 'anything')
+
+
+def test_intent_regex_engine_with_different_modules():
+    # the re module reads "[[:alpha:]]+" as a set of characters followed by "]+", and regex reads it as letters
+    engine = IntentRegexEngine(re_module=re)
+    engine.add(['[[:alpha:]]+'], ['x'])
+    assert engine.match('[]', with_forms=False)[0] == [1.0]
+    assert engine.match('[]')[0] == [1.0]
+    if regex is not None:
+        assert engine.match('[]')[1] == {}
+        assert engine.match('abc') == ([0.0], {'x': {}})
+
+
+def test_prefilter_with_inline_flags():
+    engine = IntentRegexEngine()
+    engine.add(['(?i)hello', 'world'], ['greet', 'world'])
+    assert engine._prefilter is None
+    assert engine.match('HELLO')[0] == [1.0, 0.0]
@@ -1,6 +1,11 @@
 from dialogic.utils.collections import make_unique, sample_at_most
+from dialogic.utils.lazy_modules import LazyModule, lazy_import
 
+import pytest
 import random
+import subprocess
+import sys
+import types
 
 
 def test_make_unique():
@@ -24,3 +29,41 @@ def test_sample_at_most():
             assert len(set(y)) == len(y)
             assert len(y) == min(m, len(set(x)))
             assert not set(y).difference(set(x))
+
+
+def test_lazy_module():
+    module = types.ModuleType('lazy_test')
+    module.__getattr__ = lambda name: name.upper() if name.startswith('lazy') else getattr(object, name)
+    module.__class__ = LazyModule
+    # the fallback used when the module-level __getattr__ is not supported (Python 3.6)
+    assert LazyModule.__getattr__(module, 'lazy_value') == 'LAZY_VALUE'
+    assert module.lazy_value == 'LAZY_VALUE'
+    with pytest.raises(AttributeError):
+        LazyModule.__getattr__(module, 'missing')
+    with pytest.raises(AttributeError):
+        LazyModule.__getattr__(types.ModuleType('empty'), 'missing')
+
+
+def test_lazy_submodules():
+    code = (
+        'import dialogic; from dialogic.nlu import basic_nlu; '
+        'print(dialogic.nlu.matchers.__name__, dialogic.flask_server.__name__, dialogic.server.flask_ngrok.__name__, '
+        'type(basic_nlu.PYMORPHY).__name__)'
+    )
+    process = subprocess.run(
+        [sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+    assert process.returncode == 0, process.stderr
+    assert process.stdout.split() == [
+        'dialogic.nlu.matchers', 'dialogic.server.flask_server', 'dialogic.server.flask_ngrok', 'MorphAnalyzer',
+    ]
+
+
+def test_lazy_import():
+    sys.modules.pop('colorsys', None)
+    colorsys = lazy_import('colorsys')
+    assert 'colorsys' not in sys.modules
+    assert colorsys.rgb_to_hsv(1, 0, 0) == (0, 1, 1)
+    assert 'colorsys' in sys.modules
+    with pytest.raises(ImportError):
+        lazy_import('no_such_module_for_dialogic').anything